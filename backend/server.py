@@ -1,27 +1,713 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, File, Form, Header, Request, Response, UploadFile, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pymongo import MongoClient
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from bson.errors import InvalidId
+from pydantic import BaseModel, Field, EmailStr, NonNegativeInt
+from typing import List, Optional, Dict, Any, Tuple, Literal
 from datetime import datetime, timedelta
 import os
 import jwt
 import hashlib
+import random
 import uuid
 from dotenv import load_dotenv
 import pandas as pd
-from io import BytesIO
-from fastapi.responses import StreamingResponse
+import numpy as np
+from io import BytesIO, StringIO
+import csv
+import base64
+import json
+import tempfile
+import zipfile
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from fastapi.datastructures import DefaultPlaceholder
+import gzip
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import asyncio
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, wraps
+from contextlib import asynccontextmanager
+from passlib.context import CryptContext
+from collections import defaultdict, deque, OrderedDict
+import time
+import threading
+import sys
+import traceback
+import contextvars
+import cProfile
+import pstats
+from pymongo import monitoring
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard JSON response
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is used when brotli is not installed
+    brotli = None
 
 load_dotenv()
 
-app = FastAPI(title="Kongu Polytechnic MCQ Test Platform")
+# Response encoding: orjson serialization and negotiated compression above a size threshold
+FAST_JSON_ENABLED = os.environ.get("FAST_JSON_ENABLED", "false").lower() == "true" and orjson is not None
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get("COMPRESSION_MINIMUM_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+
+def orjson_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, which handles datetimes and numpy values natively"""
+    
+    def render(self, content) -> bytes:
+        return render_json(content)
+
+def render_json(content) -> bytes:
+    """Serialize a payload to JSON bytes, via orjson when enabled"""
+    if not FAST_JSON_ENABLED:
+        return json.dumps(jsonable_encoder(content)).encode()
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    try:
+        return orjson.dumps(content, default=orjson_default, option=option)
+    except TypeError:
+        # Payloads holding pydantic models or other custom types take the slow path
+        return orjson.dumps(jsonable_encoder(content), option=option)
+
+class FastJSONRoute(APIRoute):
+    """Routes whose dict/list results are rendered by FastJSONResponse directly
+    
+    FastAPI runs jsonable_encoder over plain return values before rendering;
+    returning a Response from the endpoint skips that pass, which dominates
+    encode time for large lists of nested documents. The module-level handler
+    functions are left untouched.
+    """
+    
+    def __init__(self, path: str, endpoint, **kwargs):
+        response_model = kwargs.get("response_model")
+        explicit_model = response_model is not None and not isinstance(response_model, DefaultPlaceholder)
+        if FAST_JSON_ENABLED and not explicit_model and asyncio.iscoroutinefunction(endpoint):
+            endpoint = fast_json_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+def fast_json_endpoint(handler):
+    @wraps(handler)
+    async def endpoint(*args, **kwargs):
+        result = await handler(*args, **kwargs)
+        if isinstance(result, (dict, list)):
+            return FastJSONResponse(result)
+        return result
+    return endpoint
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """A strong ETag names one representation, so each content-coding gets its own"""
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+def strip_etag_encoding(etag: str) -> str:
+    for encoding in ("br", "gzip"):
+        if etag.endswith(f'-{encoding}"'):
+            return etag[:-len(encoding) - 2] + '"'
+    return etag
+
+class CompressionMiddleware:
+    """Compress complete (single-message) responses with brotli or gzip above a size threshold
+    
+    Streaming responses (SSE, CSV/XLSX exports) pass through untouched so
+    their chunks are never held back by the compressor.
+    """
+    
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        headers = {key.decode().lower(): value.decode() for key, value in scope["headers"]}
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        passthrough = False
+        
+        async def compressing_send(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            response_headers = {key.decode().lower(): value.decode() for key, value in start_message["headers"]}
+            if (message.get("more_body", False) or len(body) < self.minimum_size
+                    or "content-encoding" in response_headers
+                    or response_headers.get("content-type", "").startswith("text/event-stream")):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+            
+            compressed = compress_body(body, encoding)
+            raw_headers = [
+                (key, value) for key, value in start_message["headers"]
+                if key.lower() not in (b"content-length", b"vary", b"etag")
+            ]
+            if "etag" in response_headers:
+                raw_headers.append((b"etag", encoded_etag(response_headers["etag"], encoding).encode()))
+            vary = response_headers.get("vary")
+            raw_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", (f"{vary}, Accept-Encoding" if vary else "Accept-Encoding").encode())
+            ]
+            await send({**start_message, "headers": raw_headers})
+            await send({"type": "http.response.body", "body": compressed})
+        
+        await self.app(scope, receive, compressing_send)
+
+# Metrics: Prometheus text exposition on /api/metrics
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.environ.get("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+# Event-loop blocking watchdog: a helper thread reports stalls longer than the threshold
+BLOCKING_WATCHDOG_ENABLED = os.environ.get("BLOCKING_WATCHDOG_ENABLED", "true").lower() == "true"
+BLOCKING_THRESHOLD_SECONDS = float(os.environ.get("BLOCKING_THRESHOLD_SECONDS", "0.25"))
+BLOCKING_STACK_DEPTH = int(os.environ.get("BLOCKING_STACK_DEPTH", "25"))
+
+# On-demand request profiling: staff send the profile header, or a fraction of requests is sampled
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER = os.environ.get("PROFILE_HEADER", "X-Profile").lower().encode()
+PROFILE_TTL_SECONDS = int(os.environ.get("PROFILE_TTL_SECONDS", "86400"))
+PROFILE_TOP_FUNCTIONS = int(os.environ.get("PROFILE_TOP_FUNCTIONS", "40"))
+PROFILE_MAX_MONGO_COMMANDS = int(os.environ.get("PROFILE_MAX_MONGO_COMMANDS", "500"))
+# Never profiled: the observability endpoints themselves and long-lived event streams
+PROFILE_EXCLUDED_PATHS = ("/api/metrics", "/api/staff/profiles")
+
+# Mongo commands issued by the current (profiled) request; None when not profiling
+mongo_command_trace = contextvars.ContextVar("mongo_command_trace", default=None)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names, values, extra: Tuple[str, str] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + "}"
+
+class Metric:
+    """Base for labelled metrics; samples are keyed by the tuple of label values
+    
+    Updates take a lock because pymongo's command listeners fire from motor's
+    worker threads as well as the event loop.
+    """
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {value}")
+        return lines
+    
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+    
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+class Counter(Metric):
+    kind = "counter"
+    
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+    
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+    
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+    
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, *labels, value: float):
+        # Per-bucket (non-cumulative) counts, then sum and count; cumulated at render time
+        with self._lock:
+            sample = self._values.get(labels)
+            if sample is None:
+                sample = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[0][i] += 1
+                    break
+            sample[1] += value
+            sample[2] += 1
+    
+    def value(self, *labels):
+        sample = self._values.get(labels)
+        return (sample[2], sample[1]) if sample else (0, 0.0)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((labels, ([*counts], total, count)) for labels, (counts, total, count) in self._values.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labels, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+    
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+    
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+metrics = MetricsRegistry()
+http_request_duration = metrics.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+))
+http_requests_total = metrics.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+))
+http_requests_in_progress = metrics.register(Gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled", ("method",)
+))
+mongo_command_duration = metrics.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by collection and command", ("collection", "command")
+))
+mongo_command_failures = metrics.register(Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands by collection and command", ("collection", "command")
+))
+mongo_documents = metrics.register(Counter(
+    "mongo_documents_total", "Documents returned or written by MongoDB commands", ("collection", "command")
+))
+event_loop_lag = metrics.register(Histogram(
+    "event_loop_lag_seconds", "Delay of a scheduled event-loop wakeup beyond its deadline",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+))
+event_loop_blocks = metrics.register(Counter(
+    "event_loop_blocks_total", "Event-loop stalls longer than the blocking threshold, by route", ("route",)
+))
+event_loop_block_duration = metrics.register(Histogram(
+    "event_loop_block_duration_seconds", "Duration of event-loop stalls by route", ("route",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+))
+
+def route_template(scope) -> str:
+    """Route path template that handled the request, so ids do not explode label cardinality"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+class MetricsMiddleware:
+    """Per-route latency histogram, request counter and in-flight gauge"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        method = scope["method"]
+        status_code = 500
+        
+        async def recording_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        http_requests_in_progress.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            route = route_template(scope)
+            http_requests_in_progress.dec(method)
+            http_request_duration.observe(method, route, value=time.perf_counter() - started)
+            http_requests_total.inc(method, route, str(status_code))
+
+def reply_document_count(command_name: str, reply: dict) -> int:
+    if "cursor" in reply:
+        cursor = reply["cursor"]
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if command_name in ("insert", "update", "delete", "count"):
+        return reply.get("n", 0)
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") is not None else 0
+    return 0
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command monitoring: latency, failures and document counts per collection"""
+    
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(event):
+        return (event.connection_id, event.request_id)
+    
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        with self._lock:
+            self._collections[self._key(event)] = collection if isinstance(collection, str) else event.database_name
+    
+    def _finish(self, event) -> str:
+        with self._lock:
+            return self._collections.pop(self._key(event), event.database_name)
+    
+    def succeeded(self, event):
+        collection = self._finish(event)
+        count = reply_document_count(event.command_name, event.reply)
+        self._trace(event, collection, count, True)
+        if METRICS_ENABLED:
+            mongo_command_duration.observe(collection, event.command_name, value=event.duration_micros / 1e6)
+            if count:
+                mongo_documents.inc(collection, event.command_name, amount=count)
+    
+    def failed(self, event):
+        collection = self._finish(event)
+        self._trace(event, collection, 0, False)
+        if METRICS_ENABLED:
+            mongo_command_duration.observe(collection, event.command_name, value=event.duration_micros / 1e6)
+            mongo_command_failures.inc(collection, event.command_name)
+    
+    @staticmethod
+    def _trace(event, collection: str, documents: int, ok: bool):
+        # motor runs pymongo with the caller's context copied, so this sees the request's trace
+        trace = mongo_command_trace.get()
+        if trace is not None and len(trace) < PROFILE_MAX_MONGO_COMMANDS:
+            trace.append({
+                "collection": collection,
+                "command": event.command_name,
+                "duration_ms": round(event.duration_micros / 1000, 3),
+                "documents": documents,
+                "ok": ok
+            })
+
+mongo_command_metrics = MongoCommandMetrics()
+
+class ProfilingMiddleware:
+    """cProfile selected requests and record the Mongo commands they issue
+    
+    A request is profiled when a staff caller sends the profile header or it
+    falls within PROFILE_SAMPLE_RATE; all other requests go straight through.
+    cProfile sees the whole thread, so other requests' coroutines interleaved
+    with a profiled one show up in its profile too. Only one request is
+    profiled at a time to keep that bounded.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self._active = False
+    
+    def select(self, scope) -> Optional[Tuple[str, Optional[str]]]:
+        """(trigger, staff user id) when this request should be profiled, else None"""
+        if self._active or scope["path"].startswith(PROFILE_EXCLUDED_PATHS) or scope["path"].endswith("/stream"):
+            return None
+        headers = dict(scope["headers"])
+        if headers.get(PROFILE_HEADER, b"").lower() in (b"1", b"true"):
+            user = staff_from_authorization(headers.get(b"authorization", b"").decode())
+            if user:
+                return "header", user["user_id"]
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return "sample", None
+        return None
+    
+    async def __call__(self, scope, receive, send):
+        selected = self.select(scope) if scope["type"] == "http" else None
+        if selected is None:
+            await self.app(scope, receive, send)
+            return
+        
+        profile_id = str(uuid.uuid4())
+        status_code = 500
+        
+        async def profiled_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message["headers"], (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+        
+        trace = []
+        trace_token = mongo_command_trace.set(trace)
+        profiler = cProfile.Profile()
+        self._active = True
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, profiled_send)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            self._active = False
+            mongo_command_trace.reset(trace_token)
+            try:
+                await save_request_profile(profile_id, scope, selected, status_code, duration, profiler, trace)
+            except Exception as e:
+                print(f"Failed to store request profile {profile_id}: {e}")
+
+def staff_from_authorization(authorization: str) -> Optional[dict]:
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        user = decode_token(token)
+    except HTTPException:
+        return None
+    return user if user.get("user_type") == "staff" else None
+
+def profile_stats_text(profiler: cProfile.Profile) -> str:
+    output = StringIO()
+    pstats.Stats(profiler, stream=output).strip_dirs().sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+    return output.getvalue()
+
+async def save_request_profile(profile_id: str, scope, selected: Tuple[str, Optional[str]], status_code: int,
+                               duration: float, profiler: cProfile.Profile, trace: List[dict]):
+    trigger, requested_by = selected
+    now = datetime.utcnow()
+    await db.request_profiles.insert_one({
+        "id": profile_id,
+        "method": scope["method"],
+        "path": scope["path"],
+        "route": route_template(scope),
+        "status": status_code,
+        "duration_ms": round(duration * 1000, 3),
+        "trigger": trigger,
+        "requested_by": requested_by,
+        "mongo_command_count": len(trace),
+        "mongo_time_ms": round(sum(command["duration_ms"] for command in trace), 3),
+        "mongo_commands": trace,
+        "stats": profile_stats_text(profiler),
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=PROFILE_TTL_SECONDS)
+    })
+
+class EventLoopLagMonitor:
+    """Sleeps for interval and records how late each wakeup was; a blocked loop shows up as lag"""
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task = None
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            event_loop_lag.observe(value=max(loop.time() - started - self.interval, 0.0))
+
+event_loop_lag_monitor = EventLoopLagMonitor(EVENT_LOOP_LAG_INTERVAL_SECONDS)
+
+class BlockingWatchdog:
+    """Detects event-loop stalls from a helper thread and attributes them to the blocking route
+    
+    A coroutine stamps a heartbeat every threshold / 4 seconds. When the
+    thread sees no heartbeat for longer than the threshold, the loop is stuck
+    in synchronous code: the thread snapshots the loop thread's stack and the
+    request whose task is running, then records the stall's duration once the
+    heartbeat resumes.
+    """
+    
+    def __init__(self, threshold: float, stack_depth: int):
+        self.threshold = threshold
+        self.stack_depth = stack_depth
+        self.interval = threshold / 4
+        self.active_requests = {}  # task -> ASGI scope, maintained by BlockingWatchdogMiddleware
+        self.recent = deque(maxlen=50)
+        self._heartbeat = 0.0
+        self._loop = None
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stopped = threading.Event()
+    
+    def start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread_id = threading.get_ident()
+            self._heartbeat = time.monotonic()
+            self._stopped.clear()
+            self._task = asyncio.create_task(self.beat())
+            self._thread = threading.Thread(target=self.watch, name="event-loop-watchdog", daemon=True)
+            self._thread.start()
+    
+    async def stop(self):
+        if self._task is not None:
+            self._stopped.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+    
+    async def beat(self):
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+    
+    def watch(self):
+        stall = None
+        while not self._stopped.wait(self.interval):
+            last_beat = self._heartbeat
+            if stall is None and time.monotonic() - last_beat > self.threshold:
+                stall = self.capture(last_beat)
+            elif stall is not None and last_beat != stall["last_beat"]:
+                self.record(stall, last_beat - stall["last_beat"] - self.interval)
+                stall = None
+    
+    def capture(self, last_beat: float) -> dict:
+        """Snapshot what the loop thread is doing right now (runs on the watchdog thread)"""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame, limit=self.stack_depth)) if frame else ""
+        task = asyncio.current_task(self._loop)
+        scope = self.active_requests.get(task)
+        stall = {
+            "route": route_template(scope) if scope else "<background>",
+            "method": scope["method"] if scope else None,
+            "path": scope["path"] if scope else None,
+            "task": task.get_name() if task else None,
+            "stack": stack,
+            "detected_at": datetime.utcnow(),
+            "last_beat": last_beat
+        }
+        print(f"Event loop blocked for over {self.threshold}s in {stall['route']} ({stall['task']}):\n{stack}")
+        return stall
+    
+    def record(self, stall: dict, duration: float):
+        duration = max(duration, self.threshold)
+        event_loop_blocks.inc(stall["route"])
+        event_loop_block_duration.observe(stall["route"], value=duration)
+        print(f"Event loop unblocked after {duration:.3f}s in {stall['route']}")
+        self.recent.append({
+            **{key: value for key, value in stall.items() if key != "last_beat"},
+            "duration_seconds": round(duration, 3)
+        })
+
+blocking_watchdog = BlockingWatchdog(BLOCKING_THRESHOLD_SECONDS, BLOCKING_STACK_DEPTH)
+
+class BlockingWatchdogMiddleware:
+    """Registers the task handling each request so the watchdog can name the blocking route"""
+    
+    def __init__(self, app, watchdog: BlockingWatchdog):
+        self.app = app
+        self.watchdog = watchdog
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        task = asyncio.current_task()
+        self.watchdog.active_requests[task] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.watchdog.active_requests.pop(task, None)
+
+app = FastAPI(
+    title="Kongu Polytechnic MCQ Test Platform",
+    default_response_class=FastJSONResponse if FAST_JSON_ENABLED else JSONResponse
+)
+app.router.route_class = FastJSONRoute
+
+# Response compression
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
 
 # CORS setup
 app.add_middleware(
@@ -32,15 +718,96 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MongoDB connection
+# Route attribution for the event-loop blocking watchdog
+if BLOCKING_WATCHDOG_ENABLED:
+    app.add_middleware(BlockingWatchdogMiddleware, watchdog=blocking_watchdog)
+
+# On-demand profiling (inside metrics, so profiled requests are still counted)
+app.add_middleware(ProfilingMiddleware)
+
+# Request metrics (outermost, so timings include compression and CORS)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# MongoDB connection (non-blocking motor client, pool sized for exam-start bursts)
 MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.environ.get("DB_NAME", "kongu_mcq_db")
-client = MongoClient(MONGO_URL)
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "200"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+client = AsyncIOMotorClient(
+    MONGO_URL,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    event_listeners=[mongo_command_metrics],
+)
 db = client[DB_NAME]
 
+# Live test session tracking ("mongo" is shared across workers, "memory" is per process)
+LIVE_SESSION_BACKEND = os.environ.get("LIVE_SESSION_BACKEND", "mongo")
+LIVE_SESSION_TTL_SECONDS = int(os.environ.get("LIVE_SESSION_TTL_SECONDS", "120"))
+LIVE_MONITOR_TICK_SECONDS = float(os.environ.get("LIVE_MONITOR_TICK_SECONDS", "1"))
+LIVE_MONITOR_QUEUE_SIZE = int(os.environ.get("LIVE_MONITOR_QUEUE_SIZE", "30"))
+LIVE_MONITOR_KEEPALIVE_SECONDS = float(os.environ.get("LIVE_MONITOR_KEEPALIVE_SECONDS", "15"))
+LIVE_STREAM_TOKEN_TTL_SECONDS = int(os.environ.get("LIVE_STREAM_TOKEN_TTL_SECONDS", "60"))
+
+# Write-behind answer autosave
+AUTOSAVE_FLUSH_SECONDS = float(os.environ.get("AUTOSAVE_FLUSH_SECONDS", "5"))
+AUTOSAVE_MAX_PENDING = int(os.environ.get("AUTOSAVE_MAX_PENDING", "5000"))
+# Drafts left behind by abandoned tests expire this long after their last save
+DRAFT_TTL_SECONDS = int(os.environ.get("DRAFT_TTL_SECONDS", "86400"))
+
+# Principal resolution: cached token verification and user profiles
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.environ.get("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+# HTTP caching of reference data
+RESPONSE_MEMO_MAX_ENTRIES = int(os.environ.get("RESPONSE_MEMO_MAX_ENTRIES", "256"))
+REFERENCE_DATA_MAX_AGE_SECONDS = int(os.environ.get("REFERENCE_DATA_MAX_AGE_SECONDS", "3600"))
+
+# Password hashing (PBKDF2-SHA256 in a process pool; 0 workers hashes in a thread instead)
+PASSWORD_HASH_ROUNDS = int(os.environ.get("PASSWORD_HASH_ROUNDS", "200000"))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+# Initial roster passwords use fewer rounds; login upgrades them to PASSWORD_HASH_ROUNDS
+ROSTER_PASSWORD_HASH_ROUNDS = int(os.environ.get("ROSTER_PASSWORD_HASH_ROUNDS", "10000"))
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get("PASSWORD_HASH_CONCURRENCY", str(2 * (os.cpu_count() or 2))))
+
+# Keyset pagination for list endpoints
+PAGE_SIZE_DEFAULT = int(os.environ.get("PAGE_SIZE_DEFAULT", "50"))
+PAGE_SIZE_MAX = int(os.environ.get("PAGE_SIZE_MAX", "500"))
+
+# Bulk CSV/XLSX imports: rows parsed, validated and inserted per chunk
+IMPORT_CHUNK_ROWS = int(os.environ.get("IMPORT_CHUNK_ROWS", "1000"))
+IMPORT_MAX_ERRORS = int(os.environ.get("IMPORT_MAX_ERRORS", "200"))
+
+# Question pool cache configuration
+QUESTION_POOL_CACHE_TTL_SECONDS = int(os.environ.get("QUESTION_POOL_CACHE_TTL_SECONDS", "300"))
+QUESTION_POOL_CACHE_MAX_TESTS = int(os.environ.get("QUESTION_POOL_CACHE_MAX_TESTS", "64"))
+
 # Email configuration (blank for now)
 GMAIL_EMAIL = os.environ.get("GMAIL_EMAIL", "")
 GMAIL_PASSWORD = os.environ.get("GMAIL_PASSWORD", "")
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
+SMTP_USE_TLS = os.environ.get("SMTP_USE_TLS", "true").lower() == "true"
+SMTP_USERNAME = os.environ.get("SMTP_USERNAME", GMAIL_EMAIL)
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", GMAIL_PASSWORD)
+EMAIL_FROM = os.environ.get("EMAIL_FROM", GMAIL_EMAIL)
+
+# Email outbox dispatcher configuration
+EMAIL_BATCH_SIZE = int(os.environ.get("EMAIL_BATCH_SIZE", "50"))
+EMAIL_CONCURRENCY = int(os.environ.get("EMAIL_CONCURRENCY", "2"))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_SECONDS = float(os.environ.get("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_POLL_INTERVAL_SECONDS = float(os.environ.get("EMAIL_POLL_INTERVAL_SECONDS", "2"))
+EMAIL_LEASE_SECONDS = int(os.environ.get("EMAIL_LEASE_SECONDS", "300"))
 
 # Security
 security = HTTPBearer()
@@ -107,61 +874,1492 @@ class TestCreate(BaseModel):
     duration_minutes: int
     target_year: int
     target_semester: int
+    question_count: int = Field(default=25, gt=0)  # questions drawn per student paper
 
 class TestAttempt(BaseModel):
     test_id: str
     student_id: str
-    answers: Dict[str, int]  # question_id -> selected_option_index
+    answers: Dict[str, NonNegativeInt]  # question_id -> selected_option_index
     tab_switches: int
     is_malpractice: bool
     completion_time: Optional[datetime] = None
 
-# In-memory storage for live test sessions
-live_sessions = {}  # test_id -> {student_id: {start_time, current_question, etc}}
+class AnswerAutosave(BaseModel):
+    answers: Dict[str, NonNegativeInt]  # question_id -> selected_option_index, may be partial
+    tab_switches: Optional[int] = None
+
+class Heartbeat(BaseModel):
+    current_question: int
+    status: Literal["active", "suspended"] = "active"  # only ending the session marks it submitted
+
+class InMemoryLiveSessionStore:
+    """Live test sessions held in this process; only suitable for a single worker"""
+    
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._sessions = {}  # test_id -> {student_id: session}
+    
+    async def start(self, test_id: str, student_id: str, student_name: str, register_number: str):
+        now = datetime.utcnow()
+        sessions = self._sessions.setdefault(test_id, {})
+        session = sessions.get(student_id) or {"student_id": student_id, "start_time": now, "current_question": 0}
+        session.update({
+            "student_name": student_name,
+            "register_number": register_number,
+            "status": "active",
+            "last_seen": now
+        })
+        sessions[student_id] = session
+    
+    async def heartbeat(self, test_id: str, student_id: str, current_question: int, status: str) -> bool:
+        session = self._sessions.get(test_id, {}).get(student_id)
+        if session is None or self._expired(session) or session["status"] == "submitted":
+            return False
+        session.update({"current_question": current_question, "status": status, "last_seen": datetime.utcnow()})
+        return True
+    
+    async def is_active(self, test_id: str, student_id: str) -> bool:
+        session = self._sessions.get(test_id, {}).get(student_id)
+        return session is not None and not self._expired(session) and session["status"] != "submitted"
+    
+    async def end(self, test_id: str, student_id: str):
+        # Submitted sessions linger until expiry so live monitors can report the submission
+        session = self._sessions.get(test_id, {}).get(student_id)
+        if session is not None:
+            session.update({"status": "submitted", "last_seen": datetime.utcnow()})
+    
+    async def list(self, test_id: str, include_submitted: bool = False) -> List[dict]:
+        sessions = self._sessions.get(test_id, {})
+        for student_id in [sid for sid, session in sessions.items() if self._expired(session)]:
+            del sessions[student_id]
+        return [
+            dict(session) for session in sessions.values()
+            if include_submitted or session["status"] != "submitted"
+        ]
+    
+    def _expired(self, session: dict) -> bool:
+        return datetime.utcnow() - session["last_seen"] > timedelta(seconds=self.ttl_seconds)
+
+class MongoLiveSessionStore:
+    """Live test sessions shared by all workers through a TTL-indexed collection"""
+    
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+    
+    async def start(self, test_id: str, student_id: str, student_name: str, register_number: str):
+        now = datetime.utcnow()
+        await db.live_sessions.update_one(
+            {"test_id": test_id, "student_id": student_id},
+            {
+                "$set": {
+                    "student_name": student_name,
+                    "register_number": register_number,
+                    "status": "active",
+                    "last_seen": now,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds)
+                },
+                "$setOnInsert": {"start_time": now, "current_question": 0}
+            },
+            upsert=True
+        )
+    
+    async def heartbeat(self, test_id: str, student_id: str, current_question: int, status: str) -> bool:
+        now = datetime.utcnow()
+        result = await db.live_sessions.update_one(
+            {"test_id": test_id, "student_id": student_id, "status": {"$ne": "submitted"}, "expires_at": {"$gt": now}},
+            {"$set": {
+                "current_question": current_question,
+                "status": status,
+                "last_seen": now,
+                "expires_at": now + timedelta(seconds=self.ttl_seconds)
+            }}
+        )
+        return result.matched_count > 0
+    
+    async def is_active(self, test_id: str, student_id: str) -> bool:
+        session = await db.live_sessions.find_one(
+            {"test_id": test_id, "student_id": student_id, "status": {"$ne": "submitted"},
+             "expires_at": {"$gt": datetime.utcnow()}},
+            {"_id": 1}
+        )
+        return session is not None
+    
+    async def end(self, test_id: str, student_id: str):
+        # Submitted sessions linger until expiry so live monitors can report the submission
+        now = datetime.utcnow()
+        await db.live_sessions.update_one(
+            {"test_id": test_id, "student_id": student_id},
+            {"$set": {"status": "submitted", "last_seen": now, "expires_at": now + timedelta(seconds=self.ttl_seconds)}}
+        )
+    
+    async def list(self, test_id: str, include_submitted: bool = False) -> List[dict]:
+        # The TTL monitor only runs once a minute, so filter out stale sessions here too
+        query = {"test_id": test_id, "expires_at": {"$gt": datetime.utcnow()}}
+        if not include_submitted:
+            query["status"] = {"$ne": "submitted"}
+        return await db.live_sessions.find(query, {"_id": 0, "test_id": 0, "expires_at": 0}).to_list(length=None)
+
+LIVE_SESSION_STORES = {"memory": InMemoryLiveSessionStore, "mongo": MongoLiveSessionStore}
+if LIVE_SESSION_BACKEND not in LIVE_SESSION_STORES:
+    raise ValueError(f"Unknown LIVE_SESSION_BACKEND: {LIVE_SESSION_BACKEND}")
+live_session_store = LIVE_SESSION_STORES[LIVE_SESSION_BACKEND](LIVE_SESSION_TTL_SECONDS)
+
+# Per-document write errors worth retrying: a racing upsert on the unique key, write conflicts and failovers
+TRANSIENT_WRITE_ERROR_CODES = {11000, 112, 91, 189, 10107, 11600, 11602, 13435}
+
+class AnswerAutosaveBuffer:
+    """Coalesces autosaved answers in memory and flushes them to draft_attempts in bulk
+    
+    Only the latest answer per question is kept for each (test_id, student_id),
+    so however often clients save, each draft receives at most one upsert per
+    flush interval.
+    """
+    
+    def __init__(self, flush_seconds: float, max_pending: int):
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._pending = {}  # (test_id, student_id) -> {"answers": {...}, "tab_switches": int}
+        self._flush_requested = asyncio.Event()
+        self._task = None
+    
+    def record(self, test_id: str, student_id: str, answers: Dict[str, int], tab_switches: Optional[int] = None):
+        entry = self._pending.setdefault((test_id, student_id), {"answers": {}, "tab_switches": None})
+        entry["answers"].update(answers)
+        if tab_switches is not None:
+            entry["tab_switches"] = max(tab_switches, entry["tab_switches"] or 0)
+        if len(self._pending) >= self.max_pending:
+            self._flush_requested.set()
+    
+    def pending(self, test_id: str, student_id: str) -> Optional[dict]:
+        return self._pending.get((test_id, student_id))
+    
+    def pop(self, test_id: str, student_id: str) -> Optional[dict]:
+        return self._pending.pop((test_id, student_id), None)
+    
+    def clear(self):
+        self._pending.clear()
+    
+    async def flush(self) -> int:
+        """Write every pending draft with unordered bulk upserts; returns the number of drafts written
+        
+        Drafts whose write failed transiently are put back for the next flush;
+        ones the server rejected outright are dropped so they cannot block it.
+        """
+        if not self._pending:
+            return 0
+        drained, self._pending = self._pending, {}
+        # Another worker may have finalized the attempt already; an upsert now would resurrect its draft
+        for key in await submitted_attempt_keys(list(drained)):
+            drained.pop(key, None)
+        now = datetime.utcnow()
+        keys = list(drained)
+        operations = []
+        for test_id, student_id in keys:
+            entry = drained[(test_id, student_id)]
+            update = {f"answers.{qid}": selected for qid, selected in entry["answers"].items()}
+            update["updated_at"] = now
+            operations.append(UpdateOne(
+                {"test_id": test_id, "student_id": student_id},
+                {"$set": update, "$max": {"tab_switches": entry["tab_switches"] or 0}},
+                upsert=True
+            ))
+        
+        written, retry, error = 0, [], None
+        for start in range(0, len(operations), 1000):
+            chunk = operations[start:start + 1000]
+            try:
+                await db.draft_attempts.bulk_write(chunk, ordered=False)
+                written += len(chunk)
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors", [])
+                written += len(chunk) - len(write_errors)
+                for write_error in write_errors:
+                    key = keys[start + write_error["index"]]
+                    if write_error.get("code") in TRANSIENT_WRITE_ERROR_CODES:
+                        retry.append(key)
+                    else:
+                        print(f"Dropping autosaved draft {key}: {write_error.get('errmsg')}")
+            except Exception as e:
+                # Nothing from this chunk on is known to be written
+                retry.extend(keys[start:])
+                error = e
+                break
+        self._requeue({key: drained[key] for key in retry})
+        if error is not None:
+            raise error
+        return written
+    
+    def _requeue(self, entries: dict):
+        """Put drafts back without clobbering answers recorded since the drain"""
+        for key, entry in entries.items():
+            newer = self._pending.get(key)
+            if newer:
+                entry["answers"].update(newer["answers"])
+                entry["tab_switches"] = max(entry["tab_switches"] or 0, newer["tab_switches"] or 0)
+            self._pending[key] = entry
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Autosave flush failed: {e}")
+
+autosave_buffer = AnswerAutosaveBuffer(AUTOSAVE_FLUSH_SECONDS, AUTOSAVE_MAX_PENDING)
+
+async def submitted_attempt_keys(keys: List[Tuple[str, str]]) -> set:
+    """The (test_id, student_id) pairs among keys that already have a submitted attempt"""
+    if not keys:
+        return set()
+    students_by_test = defaultdict(list)
+    for test_id, student_id in keys:
+        students_by_test[test_id].append(student_id)
+    attempts = await db.test_attempts.find(
+        {"$or": [{"test_id": test_id, "student_id": {"$in": ids}} for test_id, ids in students_by_test.items()]},
+        {"_id": 0, "test_id": 1, "student_id": 1}
+    ).to_list(length=None)
+    return {(attempt["test_id"], attempt["student_id"]) for attempt in attempts}
+
+class LiveMonitorSubscriber:
+    def __init__(self, queue_size: int):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.needs_snapshot = True  # set on subscribe and whenever the client falls behind
+
+class LiveMonitor:
+    """Polls one test's live sessions once per tick and fans coalesced deltas out to subscribers
+    
+    Reading the shared store (rather than hooking this process's requests)
+    means deltas include students served by every worker. A subscriber whose
+    queue fills up is dropped back to a fresh snapshot instead of buffering
+    an unbounded backlog.
+    """
+    
+    def __init__(self, test_id: str, tick_seconds: float, queue_size: int):
+        self.test_id = test_id
+        self.tick_seconds = tick_seconds
+        self.queue_size = queue_size
+        self.sessions = {}  # student_id -> session as of the last tick
+        self.subscribers = set()
+        self.ready = asyncio.Event()
+        self._task = None
+    
+    def subscribe(self) -> LiveMonitorSubscriber:
+        subscriber = LiveMonitorSubscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return subscriber
+    
+    def unsubscribe(self, subscriber: LiveMonitorSubscriber):
+        self.subscribers.discard(subscriber)
+    
+    def snapshot(self) -> dict:
+        return {"students": [s for s in self.sessions.values() if s["status"] != "submitted"]}
+    
+    async def run(self):
+        try:
+            while self.subscribers:
+                try:
+                    await self.tick()
+                except Exception as e:
+                    print(f"Live monitor for {self.test_id} failed: {e}")
+                self.ready.set()
+                await asyncio.sleep(self.tick_seconds)
+        finally:
+            self._task = None
+            live_monitor_hub.discard(self)
+    
+    async def tick(self):
+        current = {s["student_id"]: s for s in await live_session_store.list(self.test_id, include_submitted=True)}
+        delta = diff_live_sessions(self.sessions, current)
+        self.sessions = current
+        if delta:
+            self.publish(delta)
+    
+    def publish(self, delta: dict):
+        for subscriber in self.subscribers:
+            if subscriber.needs_snapshot:
+                continue
+            try:
+                subscriber.queue.put_nowait(delta)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and resynchronise with a snapshot
+                subscriber.needs_snapshot = True
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+
+def diff_live_sessions(previous: dict, current: dict) -> dict:
+    """Coalesced join/progress/submit/leave changes between two session maps"""
+    delta = defaultdict(list)
+    for student_id, session in current.items():
+        before = previous.get(student_id)
+        if session["status"] == "submitted":
+            if before is None or before["status"] != "submitted":
+                delta["submitted"].append(student_id)
+        elif before is None or before["status"] == "submitted":
+            delta["joined"].append(session)
+        elif (before["current_question"], before["status"]) != (session["current_question"], session["status"]):
+            delta["progress"].append({
+                "student_id": student_id,
+                "current_question": session["current_question"],
+                "status": session["status"]
+            })
+    for student_id, before in previous.items():
+        if student_id not in current and before["status"] != "submitted":
+            delta["left"].append(student_id)
+    return dict(delta)
+
+class LiveMonitorHub:
+    """One LiveMonitor per watched test in this process, shared by all of its subscribers"""
+    
+    def __init__(self, tick_seconds: float, queue_size: int):
+        self.tick_seconds = tick_seconds
+        self.queue_size = queue_size
+        self._monitors = {}
+    
+    def monitor(self, test_id: str) -> LiveMonitor:
+        if test_id not in self._monitors:
+            self._monitors[test_id] = LiveMonitor(test_id, self.tick_seconds, self.queue_size)
+        return self._monitors[test_id]
+    
+    def discard(self, monitor: LiveMonitor):
+        if self._monitors.get(monitor.test_id) is monitor and not monitor.subscribers:
+            del self._monitors[monitor.test_id]
+
+live_monitor_hub = LiveMonitorHub(LIVE_MONITOR_TICK_SECONDS, LIVE_MONITOR_QUEUE_SIZE)
+
+# Projection used for every question sent to students
+SANITIZED_QUESTION_PROJECTION = {"_id": 0, "correct_answer": 0, "explanation": 0}
+
+class QuestionPool:
+    """A test's question ids plus the sanitized documents fetched for them so far"""
+    
+    def __init__(self, question_ids):
+        self.question_ids = tuple(question_ids)
+        self.documents = {}  # question_id -> sanitized question
+
+class PerTestCache:
+    """In-process TTL + LRU cache of per-test data (question pools, answer keys), keyed by test id"""
+    
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # test_id -> (expires_at, subject_id, value)
+        self._locks = {}  # test_id -> [asyncio.Lock, holders and waiters], so a cohort start loads each entry once
+    
+    def get(self, test_id: str):
+        entry = self._entries.get(test_id)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[test_id]
+            return None
+        self._entries.move_to_end(test_id)
+        return value
+    
+    def set(self, test_id: str, subject_id: str, value, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        self._entries[test_id] = (time.monotonic() + ttl, subject_id, value)
+        self._entries.move_to_end(test_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    @asynccontextmanager
+    async def lock(self, test_id: str):
+        """Serialize loads of one entry; the lock is dropped once nobody holds or awaits it"""
+        entry = self._locks.get(test_id)
+        if entry is None:
+            entry = self._locks[test_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._locks.get(test_id) is entry:
+                del self._locks[test_id]
+    
+    def invalidate_test(self, test_id: str):
+        self._entries.pop(test_id, None)
+    
+    def invalidate_subject(self, subject_id: str):
+        for test_id in [tid for tid, entry in self._entries.items() if entry[1] == subject_id]:
+            self.invalidate_test(test_id)
+    
+    def clear(self):
+        self._entries.clear()
+        self._locks.clear()
+
+question_pool_cache = PerTestCache(QUESTION_POOL_CACHE_MAX_TESTS, QUESTION_POOL_CACHE_TTL_SECONDS)
+answer_key_cache = PerTestCache(QUESTION_POOL_CACHE_MAX_TESTS, QUESTION_POOL_CACHE_TTL_SECONDS)
+item_analysis_cache = PerTestCache(QUESTION_POOL_CACHE_MAX_TESTS, QUESTION_POOL_CACHE_TTL_SECONDS)
+
+class AnswerKey:
+    """A test's answer key compiled into compact arrays for vectorized grading
+    
+    Position i holds question_ids[i]; correct[i] is its correct option index
+    and unit_masks[i] has bit b set when the question belongs to UNITS[b].
+    Selected options outside 0..option_counts[i]-1 are graded as wrong answers.
+    """
+    
+    UNANSWERED = -1
+    INVALID = -2  # answered with an option the question does not have
+    
+    def __init__(self, questions: List[dict]):
+        self.question_ids = tuple(q["id"] for q in questions)
+        self.positions = {qid: i for i, qid in enumerate(self.question_ids)}
+        self.correct = np.array([q["correct_answer"] for q in questions], dtype=np.int16)
+        # Questions stored without options are only bounded by what the answer matrix can hold
+        self.option_counts = tuple(len(q.get("options") or ()) or np.iinfo(np.int16).max for q in questions)
+        self.unit_masks = np.array(
+            [sum(1 << UNITS.index(unit) for unit in set(q.get("units", [])) if unit in UNITS) for q in questions],
+            dtype=np.uint32
+        )
+        # questions x units membership matrix, used for masked sums over many attempts
+        self.unit_matrix = ((self.unit_masks[:, None] >> np.arange(len(UNITS), dtype=np.uint32)) & 1).astype(np.int32)
+    
+    def invalid_answers(self, answers: Dict[str, int]) -> List[str]:
+        """Question ids in answers whose selected option is not one of the question's options"""
+        invalid = []
+        for qid, selected in answers.items():
+            col = self.positions.get(qid)
+            if col is not None and selected is not None and not 0 <= selected < self.option_counts[col]:
+                invalid.append(qid)
+        return invalid
+    
+    def answer_matrix(self, answer_maps: List[Dict[str, int]]) -> np.ndarray:
+        """attempts x questions matrix of selected option indices, UNANSWERED or INVALID otherwise"""
+        matrix = np.full((len(answer_maps), len(self.question_ids)), self.UNANSWERED, dtype=np.int16)
+        for row, answers in enumerate(answer_maps):
+            for qid, selected in answers.items():
+                col = self.positions.get(qid)
+                if col is not None and selected is not None:
+                    matrix[row, col] = selected if 0 <= selected < self.option_counts[col] else self.INVALID
+        return matrix
+    
+    def grade(self, answer_maps: List[Dict[str, int]]):
+        """Grade many attempts at once; returns (scores, totals, unit_correct, unit_total) arrays"""
+        selected = self.answer_matrix(answer_maps)
+        answered = selected != self.UNANSWERED
+        correct = answered & (selected == self.correct[None, :])
+        unit_correct = correct.astype(np.int32) @ self.unit_matrix
+        unit_total = answered.astype(np.int32) @ self.unit_matrix
+        return correct.sum(axis=1), answered.sum(axis=1), unit_correct, unit_total
+
+def unit_performance_from_row(unit_correct_row, unit_total_row) -> dict:
+    return {
+        unit: {"correct": int(unit_correct_row[b]), "total": int(unit_total_row[b])}
+        for b, unit in enumerate(UNITS) if unit_total_row[b] > 0
+    }
+
+def compute_item_analysis(answer_key: AnswerKey, answer_maps: List[Dict[str, int]], option_counts: Dict[str, int]) -> List[dict]:
+    """Per-question difficulty, point-biserial discrimination and distractor frequencies
+    
+    Everything is computed on the attempts x questions answer matrix. Students
+    get different papers, so each question's statistics only use the attempts
+    that answered it, and discrimination correlates item correctness with the
+    attempt's percentage score.
+    """
+    selected = answer_key.answer_matrix(answer_maps)
+    answered = selected != AnswerKey.UNANSWERED
+    correct = answered & (selected == answer_key.correct[None, :])
+    A = answered.astype(np.float64)
+    C = correct.astype(np.float64)
+    
+    answered_per_attempt = A.sum(axis=1)
+    percentage = np.divide(C.sum(axis=1), answered_per_attempt, out=np.zeros(len(A)), where=answered_per_attempt > 0)
+    
+    n = A.sum(axis=0)
+    sum_x = C.sum(axis=0)
+    sum_y = A.T @ percentage
+    sum_y2 = A.T @ (percentage ** 2)
+    sum_xy = C.T @ percentage
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        difficulty = sum_x / n
+        numerator = n * sum_xy - sum_x * sum_y
+        denominator = np.sqrt((n * sum_x - sum_x ** 2) * (n * sum_y2 - sum_y ** 2))
+        discrimination = numerator / denominator
+    
+    max_options = max([int(selected.max()) + 1 if selected.size else 0] + list(option_counts.values()))
+    option_frequencies = np.stack([(selected == option).sum(axis=0) for option in range(max_options)], axis=1) \
+        if max_options else np.zeros((len(answer_key.question_ids), 0))
+    
+    highest_selected = selected.max(axis=0) if len(selected) else np.full(len(answer_key.question_ids), -1)
+    
+    items = []
+    for i, qid in enumerate(answer_key.question_ids):
+        answered_count = int(n[i])
+        option_count = max(option_counts.get(qid, 0), int(highest_selected[i]) + 1)
+        items.append({
+            "question_id": qid,
+            "correct_answer": int(answer_key.correct[i]),
+            "answered": answered_count,
+            "difficulty": round(float(difficulty[i]), 4) if answered_count else None,
+            "discrimination": round(float(discrimination[i]), 4) if np.isfinite(discrimination[i]) else None,
+            "option_frequencies": [
+                round(float(option_frequencies[i, option]) / answered_count, 4) if answered_count else 0
+                for option in range(option_count)
+            ]
+        })
+    return items
+
+async def get_answer_key(test: dict) -> AnswerKey:
+    """Return the compiled answer key for a test, compiling it once per cache lifetime"""
+    key = answer_key_cache.get(test["id"])
+    if key is not None:
+        return key
+    
+    async with answer_key_cache.lock(test["id"]):
+        key = answer_key_cache.get(test["id"])
+        if key is not None:
+            return key
+        
+        questions = await db.questions.find(
+            {"subject_id": test["subject_id"]}, {"_id": 0, "id": 1, "correct_answer": 1, "units": 1, "options": 1}
+        ).sort("id", ASCENDING).to_list(length=None)
+        key = AnswerKey(questions)
+        answer_key_cache.set(test["id"], test["subject_id"], key)
+        return key
+
+async def get_answer_key_for_test_id(test_id: str) -> Optional[AnswerKey]:
+    """Like get_answer_key, but only reads the test document when the key is not cached"""
+    key = answer_key_cache.get(test_id)
+    if key is not None:
+        return key
+    test = await db.tests.find_one({"id": test_id}, {"_id": 0, "id": 1, "subject_id": 1})
+    return await get_answer_key(test) if test else None
+
+def check_selected_options(answer_key: AnswerKey, answers: Dict[str, int]):
+    invalid = answer_key.invalid_answers(answers)
+    if invalid:
+        raise HTTPException(status_code=422, detail=f"Selected option out of range for questions: {', '.join(invalid)}")
 
 # Helper functions
-def hash_password(password: str) -> str:
+def legacy_hash_password(password: str) -> str:
+    """Unsalted SHA-256 used before PBKDF2; only kept to verify and upgrade old hashes"""
     return hashlib.sha256(password.encode()).hexdigest()
 
+def is_legacy_hash(stored: str) -> bool:
+    return len(stored) == 64 and all(c in "0123456789abcdef" for c in stored)
+
+@lru_cache(maxsize=4)
+def password_context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=rounds)
+
+def hash_password_sync(password: str, rounds: int) -> str:
+    return password_context(rounds).hash(password)
+
+def hash_password_batch_sync(passwords: List[str], rounds: int) -> List[str]:
+    return [hash_password_sync(password, rounds) for password in passwords]
+
+def verify_password_sync(password: str, stored: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """Returns (valid, new_hash); new_hash is set when the stored hash should be upgraded"""
+    if is_legacy_hash(stored):
+        if legacy_hash_password(password) != stored:
+            return False, None
+        return True, hash_password_sync(password, rounds)
+    try:
+        return password_context(rounds).verify_and_update(password, stored)
+    except ValueError:
+        return False, None
+
+class PasswordHasher:
+    """Runs the slow KDF off the event loop in a bounded process pool
+    
+    A semaphore caps the number of in-flight hashes; callers beyond the cap
+    wait their turn instead of failing, so a login storm queues rather than
+    pinning the event loop.
+    """
+    
+    def __init__(self, rounds: int, workers: int, concurrency: int):
+        self.rounds = rounds
+        self.workers = workers
+        self.concurrency = max(1, concurrency)
+        self._semaphore = None
+        self._executor = None
+    
+    async def _run(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            if self.workers <= 0:
+                return await asyncio.to_thread(func, *args)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+    
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password_sync, password, self.rounds)
+    
+    async def hash_many(self, passwords: List[str], rounds: Optional[int] = None, chunk_size: int = 64) -> List[str]:
+        """Hash a batch in chunks so each pool task amortizes its IPC round trip"""
+        chunks = [passwords[i:i + chunk_size] for i in range(0, len(passwords), chunk_size)]
+        results = await asyncio.gather(*(
+            self._run(hash_password_batch_sync, chunk, rounds or self.rounds) for chunk in chunks
+        ))
+        return [hashed for chunk in results for hashed in chunk]
+    
+    async def verify(self, password: str, stored: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(verify_password_sync, password, stored, self.rounds)
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(PASSWORD_HASH_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_CONCURRENCY)
+
+class TTLCache:
+    """Bounded TTL + LRU mapping used for tokens and user profiles"""
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+    
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[0]:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+    
+    def set(self, key, value, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry else None
+    
+    def clear(self):
+        self._entries.clear()
+
+token_cache = TTLCache(PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS)
+profile_cache = TTLCache(PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Profile fields carried in login tokens and cached per user
+PROFILE_FIELDS = {
+    "student": ["id", "name", "register_number", "department", "year", "semester", "email"],
+    "staff": ["id", "name", "department", "academic_year", "email"]
+}
+
+def profile_claims(user: dict, user_type: str) -> dict:
+    return {field: user.get(field) for field in PROFILE_FIELDS[user_type]}
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=24)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=["HS256"])
+def decode_token(token: str) -> dict:
+    # Repeated requests with the same token skip signature verification until it expires
+    payload = token_cache.get(token)
+    if payload is not None:
         return payload
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if "scope" in payload:
+        # Scoped tokens (e.g. live-stream) only authorize their own endpoint
+        raise HTTPException(status_code=401, detail="Invalid token")
+    token_cache.set(token, payload, ttl_seconds=payload["exp"] - time.time() if "exp" in payload else None)
+    return payload
+
+def create_stream_token(user_id: str, test_id: str) -> str:
+    """Short-lived token for one test's live-status stream, safe to pass in a URL"""
+    return jwt.encode({
+        "scope": "live-stream",
+        "user_id": user_id,
+        "test_id": test_id,
+        "exp": datetime.utcnow() + timedelta(seconds=LIVE_STREAM_TOKEN_TTL_SECONDS)
+    }, SECRET_KEY, algorithm="HS256")
+
+def decode_stream_token(token: str, test_id: str) -> dict:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("scope") != "live-stream" or payload.get("test_id") != test_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return decode_token(credentials.credentials)
+
+async def resolve_profile(current_user: dict) -> Optional[dict]:
+    """The caller's students/staff profile, from token claims, the profile cache or one read"""
+    if current_user.get("profile"):
+        return current_user["profile"]
+    
+    user_type = current_user["user_type"]
+    if user_type not in PROFILE_FIELDS:
+        return None
+    key = (user_type, current_user["user_id"])
+    profile = profile_cache.get(key)
+    if profile is None:
+        collection = db.students if user_type == "student" else db.staff
+        user = await collection.find_one({"id": current_user["user_id"]}, {"_id": 0, "password": 0})
+        if user is None:
+            return None
+        profile = profile_claims(user, user_type)
+        profile_cache.set(key, profile)
+    return profile
+
+# Serialized response bodies keyed by (collection version, request key); stale versions simply age out
+response_memo = TTLCache(RESPONSE_MEMO_MAX_ENTRIES, REFERENCE_DATA_MAX_AGE_SECONDS)
+
+async def get_collection_version(name: str) -> int:
+    doc = await db.collection_versions.find_one({"_id": name})
+    return doc["version"] if doc else 0
+
+async def bump_collection_version(name: str):
+    await db.collection_versions.update_one({"_id": name}, {"$inc": {"version": 1}}, upsert=True)
+
+def make_etag(key) -> str:
+    return '"' + hashlib.sha1(repr(key).encode()).hexdigest() + '"'
+
+def matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """The If-None-Match validator that matches etag, including its per-encoding variants"""
+    if not if_none_match:
+        return None
+    for candidate in (candidate.strip() for candidate in if_none_match.split(",")):
+        if candidate == "*":
+            return etag
+        if strip_etag_encoding(candidate) == etag:
+            return candidate
+    return None
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    return matching_etag(if_none_match, etag) is not None
+
+async def cached_json_response(key, if_none_match: Optional[str], cache_control: str, build) -> Response:
+    """304 when the client's ETag matches; otherwise the memoized body, building it only on a miss
+    
+    `key` must change whenever the response would, e.g. by including the
+    collection version; `build` is an async callable returning the payload.
+    """
+    etag = make_etag(key)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    matched = matching_etag(if_none_match, etag)
+    if matched is not None:
+        # Echo the validator the client holds, which CompressionMiddleware may have suffixed
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+    
+    body = response_memo.get(key)
+    if body is None:
+        body = render_json(await build())
+        response_memo.set(key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def current_principal(current_user: dict = Depends(verify_token)) -> dict:
+    """verify_token plus the caller's resolved profile under "profile" (None if the user no longer exists)"""
+    return {**current_user, "profile": await resolve_profile(current_user)}
+
+# Fields needed when joining subjects/students onto list endpoints
+SUBJECT_SUMMARY_PROJECTION = {"_id": 0, "id": 1, "name": 1, "course_code": 1}
+STUDENT_SUMMARY_PROJECTION = {"_id": 0, "id": 1, "name": 1, "register_number": 1, "email": 1, "department": 1, "year": 1}
+
+async def fetch_by_ids(collection, ids, projection=None):
+    """Fetch documents by custom id in a single $in round trip, keyed by id"""
+    unique_ids = list(set(ids))
+    if not unique_ids:
+        return {}
+    docs = await collection.find({"id": {"$in": unique_ids}}, projection).to_list(length=None)
+    return {doc["id"]: doc for doc in docs}
 
-async def send_email(to_email: str, subject: str, body: str):
-    """Send email using Gmail SMTP"""
-    if not GMAIL_EMAIL or not GMAIL_PASSWORD:
+async def get_question_pool(test: dict) -> QuestionPool:
+    """Return the test's question pool (ids only until documents are needed), cached until the test ends"""
+    pool = question_pool_cache.get(test["id"])
+    if pool is not None:
+        return pool
+    
+    async with question_pool_cache.lock(test["id"]):
+        # Another request may have loaded the pool while we waited
+        pool = question_pool_cache.get(test["id"])
+        if pool is not None:
+            return pool
+        
+        id_docs = await db.questions.find(
+            {"subject_id": test["subject_id"]}, {"_id": 0, "id": 1}
+        ).sort("id", ASCENDING).to_list(length=None)
+        pool = QuestionPool(doc["id"] for doc in id_docs)
+        seconds_until_end = (test["end_date"] - datetime.utcnow()).total_seconds()
+        if seconds_until_end > 0:
+            question_pool_cache.set(test["id"], test["subject_id"], pool, ttl_seconds=seconds_until_end)
+        return pool
+
+def select_paper_ids(test_id: str, student_id: str, question_ids, count: int) -> List[str]:
+    """Pick a student's paper with a private RNG seeded from (test_id, student_id)
+    
+    The same student always gets the same questions in the same order for a
+    given pool, and no shared RNG state is touched so concurrent requests
+    cannot interfere with each other.
+    """
+    seed = int.from_bytes(hashlib.sha256(f"{test_id}:{student_id}".encode()).digest()[:8], "big")
+    rng = random.Random(seed)
+    count = min(count, len(question_ids))
+    return [question_ids[i] for i in rng.sample(range(len(question_ids)), count)]
+
+async def load_paper(pool: QuestionPool, question_ids: List[str]) -> List[dict]:
+    """Return sanitized documents for question_ids, fetching only those not yet cached"""
+    missing = [qid for qid in question_ids if qid not in pool.documents]
+    if missing:
+        docs = await db.questions.find({"id": {"$in": missing}}, SANITIZED_QUESTION_PROJECTION).to_list(length=None)
+        for doc in docs:
+            pool.documents[doc["id"]] = doc
+    return [pool.documents[qid] for qid in question_ids if qid in pool.documents]
+
+def insight_increments(score: int, total_questions: int, is_malpractice: bool, unit_performance: dict) -> dict:
+    """$inc document that folds one attempt into its test's insight aggregate"""
+    increments = {
+        "attempt_count": 1,
+        "score_sum": score,
+        "score_sq_sum": score * score,
+        "total_questions_sum": total_questions,
+        "malpractice_count": 1 if is_malpractice else 0
+    }
+    for unit, perf in unit_performance.items():
+        increments[f"units.{unit}.correct"] = perf["correct"]
+        increments[f"units.{unit}.total"] = perf["total"]
+        increments[f"units.{unit}.attempts"] = 1
+    return increments
+
+def test_in_progress(test: dict) -> bool:
+    """Whether students can still be sitting and submitting the test"""
+    return test.get("is_active", False) and test["start_date"] <= datetime.utcnow() <= test["end_date"]
+
+async def rebuild_test_insights(test_id: str) -> dict:
+    """Recompute a test's insight aggregate from its test_attempts documents
+    
+    The aggregate is replaced wholesale, so a submission whose $inc lands
+    between reading the attempts and the replace is lost from it. Staff
+    endpoints only rebuild once a test is no longer in progress.
+    """
+    aggregate = defaultdict(int)
+    cursor = db.test_attempts.find(
+        {"test_id": test_id},
+        {"_id": 0, "score": 1, "total_questions": 1, "is_malpractice": 1, "unit_performance": 1}
+    )
+    async for attempt in cursor:
+        increments = insight_increments(
+            attempt["score"], attempt["total_questions"], attempt["is_malpractice"],
+            attempt.get("unit_performance", {})
+        )
+        for field, value in increments.items():
+            aggregate[field] += value
+    
+    units = defaultdict(dict)
+    insight = {"test_id": test_id, "updated_at": datetime.utcnow()}
+    for field, value in aggregate.items():
+        if field.startswith("units."):
+            _, unit, stat = field.split(".")
+            units[unit][stat] = value
+        else:
+            insight[field] = value
+    insight["units"] = dict(units)
+    
+    await db.test_insights.replace_one({"test_id": test_id}, insight, upsert=True)
+    return insight
+
+def encode_cursor(last_id: ObjectId) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": str(last_id)}).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return ObjectId(json.loads(base64.urlsafe_b64decode(padded))["after"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def field_projection(fields: Optional[str], required: List[str] = ()) -> dict:
+    """Projection for a comma-separated `fields` parameter; everything but _id when not given"""
+    if not fields:
+        return {}
+    projection = {field.strip(): 1 for field in fields.split(",") if field.strip()}
+    projection.update({field: 1 for field in required})
+    return projection
+
+async def paginate(collection, query: dict, projection: dict, limit: Optional[int], cursor: Optional[str]):
+    """Keyset pagination on _id; returns (documents, next_cursor)
+    
+    Every request is paged: PAGE_SIZE_DEFAULT when no limit is given, and
+    never more than PAGE_SIZE_MAX. Clients follow next_cursor for the rest.
+    """
+    if cursor:
+        query = {**query, "_id": {"$gt": decode_cursor(cursor)}}
+    page_size = max(1, min(limit or PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX))
+    docs = await collection.find(query, projection or None).sort("_id", ASCENDING).limit(page_size + 1).to_list(length=None)
+    
+    next_cursor = None
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        next_cursor = encode_cursor(docs[-1]["_id"])
+    for doc in docs:
+        doc.pop("_id", None)
+    return docs, next_cursor
+
+def result_row(attempt: dict, student: dict) -> dict:
+    """One row of a test's staff results, joining an attempt with its student"""
+    return {
+        "student_name": student["name"],
+        "register_number": student["register_number"],
+        "email": student["email"],
+        "department": student["department"],
+        "year": student["year"],
+        "score": attempt["score"],
+        "total": attempt["total_questions"],
+        "percentage": round((attempt["score"] / attempt["total_questions"]) * 100, 2) if attempt["total_questions"] else 0,
+        "is_malpractice": attempt["is_malpractice"],
+        "tab_switches": attempt["tab_switches"],
+        "unit_performance": attempt.get("unit_performance", {}),
+        "submitted_at": attempt["submitted_at"]
+    }
+
+# Columns of the CSV/XLSX results export; unit performance is flattened to one column per unit
+EXPORT_FIELDS = [
+    "student_name", "register_number", "email", "department", "year", "score", "total",
+    "percentage", "is_malpractice", "tab_switches", "submitted_at"
+]
+EXPORT_COLUMNS = EXPORT_FIELDS + [f"{unit} (correct/total)" for unit in UNITS]
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "500"))
+
+def export_values(row: dict) -> list:
+    values = [row[field] for field in EXPORT_FIELDS]
+    for unit in UNITS:
+        perf = row["unit_performance"].get(unit)
+        values.append(f"{perf['correct']}/{perf['total']}" if perf else "")
+    return values
+
+async def iter_result_batches(test_id: str):
+    """Yield lists of export rows, reading attempts from a cursor and joining students per batch"""
+    cursor = db.test_attempts.find({"test_id": test_id}, {"_id": 0, "answers": 0}).batch_size(EXPORT_BATCH_SIZE)
+    batch = []
+    async for attempt in cursor:
+        batch.append(attempt)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield await join_result_batch(batch)
+            batch = []
+    if batch:
+        yield await join_result_batch(batch)
+
+async def join_result_batch(attempts: List[dict]) -> List[list]:
+    students = await fetch_by_ids(db.students, [a["student_id"] for a in attempts], STUDENT_SUMMARY_PROJECTION)
+    return [
+        export_values(result_row(attempt, students[attempt["student_id"]]))
+        for attempt in attempts if attempt["student_id"] in students
+    ]
+
+async def stream_results_csv(test_id: str):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    
+    async for rows in iter_result_batches(test_id):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+def append_sheet_rows(sheet, rows: List[list]):
+    for row in rows:
+        sheet.append(row)
+
+async def stream_results_xlsx(test_id: str):
+    """XLSX is a zip, so it is built in a write-only workbook on disk and streamed once complete"""
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Results")
+    sheet.append(EXPORT_COLUMNS)
+    async for rows in iter_result_batches(test_id):
+        await asyncio.to_thread(append_sheet_rows, sheet, rows)
+    
+    with tempfile.TemporaryFile() as output:
+        await asyncio.to_thread(workbook.save, output)
+        output.seek(0)
+        while True:
+            chunk = await asyncio.to_thread(output.read, 64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+def normalize_column(name) -> str:
+    return str(name).strip().lower().replace(" ", "_")
+
+def iter_upload_frames(file, filename: str, chunk_rows: int):
+    """Parse an uploaded CSV/XLSX into string DataFrames of at most chunk_rows rows"""
+    if filename.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+        
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [normalize_column(cell) for cell in next(rows, ())]
+            chunk = []
+            for row in rows:
+                # Stringify per cell: a blank cell would otherwise make pandas upcast the
+                # whole column to float64 and turn every number in it into "3.0"
+                chunk.append(["" if value is None else str(value) for value in row])
+                if len(chunk) >= chunk_rows:
+                    yield pd.DataFrame(chunk, columns=header, dtype=object)
+                    chunk = []
+            if chunk:
+                yield pd.DataFrame(chunk, columns=header, dtype=object)
+        finally:
+            workbook.close()
+    elif filename.lower().endswith(".csv"):
+        reader = pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=chunk_rows, skipinitialspace=True)
+        for frame in reader:
+            frame.columns = [normalize_column(column) for column in frame.columns]
+            yield frame
+    else:
+        raise HTTPException(status_code=400, detail="Upload a .csv or .xlsx file")
+
+async def read_upload_frames(upload: UploadFile):
+    """Async iteration over iter_upload_frames; parsing runs in a worker thread one chunk at a time"""
+    frames = iter_upload_frames(upload.file, upload.filename or "", IMPORT_CHUNK_ROWS)
+    try:
+        while True:
+            frame = await asyncio.to_thread(next, frames, None)
+            if frame is None:
+                return
+            yield frame
+    except (ValueError, zipfile.BadZipFile, pd.errors.ParserError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse upload: {e}")
+
+def require_columns(frame: pd.DataFrame, columns: List[str]):
+    missing = [column for column in columns if column not in frame.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing columns: {', '.join(missing)}")
+
+def collect_row_errors(frame: pd.DataFrame, checks: List[Tuple[pd.Series, str]], first_row: int) -> Tuple[pd.Series, List[dict]]:
+    """Combine boolean failure masks into (valid mask, per-row error list)
+    
+    Row numbers are spreadsheet lines: the header is line 1, so data starts at 2.
+    """
+    failed = pd.DataFrame({message: mask.to_numpy() for mask, message in checks}, index=frame.index)
+    invalid = failed.any(axis=1)
+    errors = [
+        {"row": first_row + int(position), "errors": [message for message, bad in failed.iloc[position].items() if bad]}
+        for position in np.flatnonzero(invalid.to_numpy())
+    ]
+    return ~invalid, errors
+
+# Accepted spellings of the correct option: 0-based index or letter
+ANSWER_LETTERS = {letter: index for index, letter in enumerate("ABCDEFGH")}
+
+def parse_question_frame(frame: pd.DataFrame, first_row: int) -> Tuple[List[dict], List[int], List[dict]]:
+    """Vectorized validation of one chunk of a question-bank upload
+    
+    Columns: question_text, option_a.. (any option_* columns, in column
+    order), correct_answer (0-based index or letter), explanation and units
+    (e.g. "Unit 1; Unit 3"). Returns (valid question fields, their row
+    numbers, row errors).
+    """
+    require_columns(frame, ["question_text", "correct_answer", "units"])
+    option_columns = [column for column in frame.columns if column.startswith("option_")]
+    if len(option_columns) < 2:
+        raise HTTPException(status_code=400, detail="At least two option_* columns are required")
+    
+    text = frame["question_text"].str.strip()
+    explanation = frame["explanation"].str.strip() if "explanation" in frame.columns else pd.Series("", index=frame.index)
+    options = frame[option_columns].apply(lambda column: column.str.strip())
+    filled = options.ne("")
+    option_count = filled.sum(axis=1)
+    # Options must be filled left to right so indexes line up with columns
+    gaps = filled.astype(int).diff(axis=1).fillna(0).gt(0).any(axis=1)
+    
+    answer_text = frame["correct_answer"].str.strip().str.upper()
+    answer = pd.to_numeric(answer_text, errors="coerce").where(lambda a: a.mod(1).eq(0))
+    answer = answer.fillna(answer_text.map(ANSWER_LETTERS))
+    
+    units = frame["units"].str.split(r"\s*[;,]\s*", regex=True).map(lambda values: [v.strip() for v in values if v.strip()])
+    bad_units = units.map(lambda values: not values or any(unit not in UNITS for unit in values))
+    
+    valid, errors = collect_row_errors(frame, [
+        (text.eq(""), "question_text is required"),
+        (option_count.lt(2), "at least two options are required"),
+        (gaps, "options must be filled without gaps"),
+        (answer.isna() | answer.lt(0) | answer.ge(option_count), "correct_answer must select a filled option"),
+        (bad_units, f"units must be one or more of: {', '.join(UNITS)}"),
+    ], first_row)
+    
+    records = [
+        {
+            "question_text": text[index],
+            "options": options.loc[index][filled.loc[index]].tolist(),
+            "correct_answer": int(answer[index]),
+            "explanation": explanation[index],
+            "units": units[index],
+        }
+        for index in frame.index[valid.to_numpy()]
+    ]
+    row_numbers = [first_row + int(position) for position in np.flatnonzero(valid.to_numpy())]
+    return records, row_numbers, errors
+
+ROSTER_COLUMNS = ["name", "register_number", "roll_number", "department", "year", "semester", "email", "password"]
+EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+
+def parse_roster_frame(frame: pd.DataFrame, first_row: int) -> Tuple[List[dict], List[int], List[dict]]:
+    """Vectorized validation of one chunk of a student roster upload
+    
+    Returns (valid student fields, their row numbers, row errors). Uniqueness
+    is not checked here; the students indexes reject duplicates on insert.
+    """
+    require_columns(frame, ROSTER_COLUMNS)
+    fields = frame[ROSTER_COLUMNS].apply(lambda column: column.str.strip())
+    year = pd.to_numeric(fields["year"], errors="coerce")
+    semester = pd.to_numeric(fields["semester"], errors="coerce")
+    
+    checks = [
+        (fields[column].eq(""), f"{column} is required")
+        for column in ["name", "register_number", "roll_number", "password"]
+    ]
+    checks += [
+        (~fields["department"].isin(DEPARTMENTS), "Invalid department"),
+        (year.isna() | year.mod(1).ne(0) | year.lt(1), "year must be a positive integer"),
+        (semester.isna() | semester.mod(1).ne(0) | semester.lt(1), "semester must be a positive integer"),
+        (~fields["email"].str.match(EMAIL_PATTERN), "email is invalid"),
+    ]
+    valid, errors = collect_row_errors(frame, checks, first_row)
+    
+    rows = fields[valid.to_numpy()].assign(year=year[valid.to_numpy()].astype(int), semester=semester[valid.to_numpy()].astype(int))
+    row_numbers = [first_row + int(position) for position in np.flatnonzero(valid.to_numpy())]
+    return rows.to_dict("records"), row_numbers, errors
+
+def duplicate_key_field(write_error: dict, fields: List[str]) -> Optional[str]:
+    """Which unique field a duplicate-key write error hit (older servers only name it in errmsg)"""
+    key_value = write_error.get("keyValue")
+    if key_value:
+        return next(iter(key_value))
+    return next((field for field in fields if field in write_error.get("errmsg", "")), None)
+
+async def insert_unordered(collection, documents: List[dict]) -> Tuple[int, List[dict]]:
+    """insert_many(ordered=False); returns (inserted count, write errors such as duplicate keys)"""
+    if not documents:
+        return 0, []
+    try:
+        result = await collection.insert_many(documents, ordered=False)
+        return len(result.inserted_ids), []
+    except BulkWriteError as e:
+        return e.details.get("nInserted", 0), e.details.get("writeErrors", [])
+
+async def enqueue_email(to_email: str, subject: str, body: str):
+    """Queue an email in the durable outbox; EmailDispatcher delivers it in the background"""
+    if not EMAIL_FROM:
         print("Email configuration not set up")
         return False
     
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = GMAIL_EMAIL
-        msg['To'] = to_email
-        msg['Subject'] = subject
+    now = datetime.utcnow()
+    await db.email_outbox.insert_one({
+        "id": str(uuid.uuid4()),
+        "to_email": to_email,
+        "subject": subject,
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now
+    })
+    return True
+
+class EmailDispatcher:
+    """Background worker that drains the email outbox over reused SMTP connections
+    
+    Each batch of due messages is claimed with a lease (so several workers can
+    share one outbox), split across at most `concurrency` SMTP connections and
+    sent from worker threads. Failed messages are retried with exponential
+    backoff until `max_attempts`, then marked as failed.
+    """
+    
+    def __init__(self, host: str, port: int, use_tls: bool, username: str, password: str, sender: str,
+                 batch_size: int = 50, concurrency: int = 2, max_attempts: int = 5,
+                 retry_base_seconds: float = 30, poll_interval_seconds: float = 2, lease_seconds: int = 300):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.lease_seconds = lease_seconds
+        self._connections = [None] * self.concurrency  # one reusable SMTP connection per slot
+        self._task = None
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.close_connections)
+    
+    async def run(self):
+        while True:
+            try:
+                sent = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Email dispatch failed: {e}")
+                sent = 0
+            if not sent:
+                await asyncio.sleep(self.poll_interval_seconds)
+    
+    async def claim_batch(self) -> List[dict]:
+        now = datetime.utcnow()
+        batch = []
+        for _ in range(self.batch_size):
+            message = await db.email_outbox.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": "sending", "locked_until": {"$lt": now}}
+                ]},
+                {"$set": {"status": "sending", "locked_until": now + timedelta(seconds=self.lease_seconds)}},
+                return_document=ReturnDocument.AFTER
+            )
+            if message is None:
+                break
+            batch.append(message)
+        return batch
+    
+    async def drain_once(self) -> int:
+        """Send one batch of due messages and record the outcome; returns the number claimed"""
+        batch = await self.claim_batch()
+        if not batch:
+            return 0
         
-        msg.attach(MIMEText(body, 'html'))
+        chunks = [batch[slot::self.concurrency] for slot in range(self.concurrency)]
+        outcomes = await asyncio.gather(*[
+            asyncio.to_thread(self._send_chunk, slot, chunk)
+            for slot, chunk in enumerate(chunks) if chunk
+        ])
         
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(GMAIL_EMAIL, GMAIL_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(GMAIL_EMAIL, to_email, text)
-        server.quit()
-        return True
-    except Exception as e:
-        print(f"Email sending failed: {e}")
-        return False
+        now = datetime.utcnow()
+        for results in outcomes:
+            for message, error in results:
+                if error is None:
+                    await db.email_outbox.update_one(
+                        {"id": message["id"]},
+                        {"$set": {"status": "sent", "sent_at": now}, "$unset": {"locked_until": ""}}
+                    )
+                    continue
+                attempts = message["attempts"] + 1
+                update = {"status": "failed" if attempts >= self.max_attempts else "pending",
+                          "attempts": attempts, "last_error": error,
+                          "next_attempt_at": now + timedelta(seconds=self.retry_base_seconds * 2 ** (attempts - 1))}
+                await db.email_outbox.update_one({"id": message["id"]}, {"$set": update, "$unset": {"locked_until": ""}})
+                print(f"Email sending failed for {message['to_email']} (attempt {attempts}): {error}")
+        return len(batch)
+    
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.use_tls:
+            connection.starttls()
+        if self.username and self.password:
+            connection.login(self.username, self.password)
+        return connection
+    
+    def _send_chunk(self, slot: int, messages: List[dict]):
+        """Runs in a worker thread: send messages over the slot's connection, reconnecting once if it dropped"""
+        results = []
+        for message in messages:
+            msg = MIMEMultipart()
+            msg['From'] = self.sender
+            msg['To'] = message["to_email"]
+            msg['Subject'] = message["subject"]
+            msg.attach(MIMEText(message["body"], 'html'))
+            text = msg.as_string()
+            
+            error = None
+            for _ in range(2):
+                try:
+                    if self._connections[slot] is None:
+                        self._connections[slot] = self._connect()
+                    self._connections[slot].sendmail(self.sender, message["to_email"], text)
+                    error = None
+                    break
+                except (smtplib.SMTPServerDisconnected, OSError) as e:
+                    self._connections[slot] = None
+                    error = str(e)
+                except Exception as e:
+                    error = str(e)
+                    break
+            results.append((message, error))
+        return results
+    
+    def close_connections(self):
+        for slot, connection in enumerate(self._connections):
+            if connection is not None:
+                try:
+                    connection.quit()
+                except Exception:
+                    pass
+                self._connections[slot] = None
+
+email_dispatcher = EmailDispatcher(
+    SMTP_HOST, SMTP_PORT, SMTP_USE_TLS, SMTP_USERNAME, SMTP_PASSWORD, EMAIL_FROM,
+    batch_size=EMAIL_BATCH_SIZE,
+    concurrency=EMAIL_CONCURRENCY,
+    max_attempts=EMAIL_MAX_ATTEMPTS,
+    retry_base_seconds=EMAIL_RETRY_BASE_SECONDS,
+    poll_interval_seconds=EMAIL_POLL_INTERVAL_SECONDS,
+    lease_seconds=EMAIL_LEASE_SECONDS
+)
+
+# Indexes backing every query shape the API issues: (collection, keys, options).
+# List endpoints page on _id, so their filter indexes end with _id as the sort key.
+INDEX_SPECS = [
+    ("students", [("id", ASCENDING)], {"unique": True}),
+    ("students", [("register_number", ASCENDING)], {"unique": True}),
+    ("students", [("email", ASCENDING)], {"unique": True}),
+    ("staff", [("id", ASCENDING)], {"unique": True}),
+    ("staff", [("email", ASCENDING)], {"unique": True}),
+    ("subjects", [("id", ASCENDING)], {"unique": True}),
+    ("subjects", [("department", ASCENDING), ("_id", ASCENDING)], {}),
+    ("questions", [("id", ASCENDING)], {"unique": True}),
+    ("questions", [("subject_id", ASCENDING)], {}),
+    ("questions", [("created_by", ASCENDING), ("_id", ASCENDING)], {}),
+    ("tests", [("id", ASCENDING)], {"unique": True}),
+    ("tests", [("created_by", ASCENDING), ("_id", ASCENDING)], {}),
+    # Matches get_available_tests: equality fields first, then the date range
+    ("tests", [
+        ("department", ASCENDING),
+        ("target_year", ASCENDING),
+        ("is_active", ASCENDING),
+        ("start_date", ASCENDING),
+        ("end_date", ASCENDING),
+    ], {}),
+    ("test_attempts", [("id", ASCENDING)], {"unique": True}),
+    ("test_attempts", [("test_id", ASCENDING), ("_id", ASCENDING)], {}),
+    ("test_attempts", [("student_id", ASCENDING)], {}),
+    ("test_insights", [("test_id", ASCENDING)], {"unique": True}),
+    ("live_sessions", [("test_id", ASCENDING), ("student_id", ASCENDING)], {"unique": True}),
+    ("draft_attempts", [("test_id", ASCENDING), ("student_id", ASCENDING)], {"unique": True}),
+    ("draft_attempts", [("updated_at", ASCENDING)], {"expireAfterSeconds": DRAFT_TTL_SECONDS}),
+    ("live_sessions", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ("email_outbox", [("status", ASCENDING), ("next_attempt_at", ASCENDING)], {}),
+    ("request_profiles", [("id", ASCENDING)], {"unique": True}),
+    ("request_profiles", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+]
+
+def index_name(keys) -> str:
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+async def ensure_indexes():
+    """Create any missing indexes from INDEX_SPECS and report which ones were created"""
+    created = []
+    existing_by_collection = {}
+    for collection, keys, options in INDEX_SPECS:
+        name = index_name(keys)
+        try:
+            if collection not in existing_by_collection:
+                existing_by_collection[collection] = await db[collection].index_information()
+            if name in existing_by_collection[collection]:
+                continue
+            await db[collection].create_index(keys, name=name, **options)
+            existing_by_collection[collection][name] = keys
+            created.append(f"{collection}.{name}")
+        except Exception as e:
+            print(f"Index creation failed for {collection}.{name}: {e}")
+    
+    if created:
+        print(f"Created indexes: {', '.join(created)}")
+    else:
+        print("All indexes already present")
+    return created
+
+@app.on_event("startup")
+async def startup_db_indexes():
+    await ensure_indexes()
+
+@app.on_event("startup")
+async def startup_email_dispatcher():
+    if EMAIL_FROM:
+        email_dispatcher.start()
+
+@app.on_event("startup")
+async def startup_autosave_buffer():
+    autosave_buffer.start()
+
+@app.on_event("startup")
+async def startup_event_loop_lag_monitor():
+    if METRICS_ENABLED:
+        event_loop_lag_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown_event_loop_lag_monitor():
+    await event_loop_lag_monitor.stop()
+
+@app.on_event("startup")
+async def startup_blocking_watchdog():
+    if BLOCKING_WATCHDOG_ENABLED:
+        blocking_watchdog.start()
+
+@app.on_event("shutdown")
+async def shutdown_blocking_watchdog():
+    await blocking_watchdog.stop()
+
+@app.on_event("shutdown")
+async def shutdown_autosave_buffer():
+    await autosave_buffer.stop()
+
+@app.on_event("shutdown")
+async def shutdown_email_dispatcher():
+    await email_dispatcher.stop()
+
+@app.on_event("shutdown")
+async def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+@app.on_event("shutdown")
+async def shutdown_db_client():
+    client.close()
 
 # API Routes
 
@@ -169,13 +2367,53 @@ async def send_email(to_email: str, subject: str, body: str):
 async def health_check():
     return {"status": "healthy", "message": "Kongu Polytechnic MCQ Platform API"}
 
+@app.get("/api/metrics")
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint; protected by METRICS_TOKEN when one is configured"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/staff/profiles")
+async def get_request_profiles(limit: int = 20, current_user: dict = Depends(verify_token)):
+    """Most recent request profiles, without their stats and command lists"""
+    if current_user["user_type"] != "staff":
+        raise HTTPException(status_code=403, detail="Only staff can view request profiles")
+    
+    profiles = await db.request_profiles.find(
+        {}, {"_id": 0, "stats": 0, "mongo_commands": 0}
+    ).sort("_id", -1).limit(max(1, min(limit, 100))).to_list(length=None)
+    return {"profiles": profiles}
+
+@app.get("/api/staff/profiles/{profile_id}")
+async def get_request_profile(profile_id: str, current_user: dict = Depends(verify_token)):
+    if current_user["user_type"] != "staff":
+        raise HTTPException(status_code=403, detail="Only staff can view request profiles")
+    
+    profile = await db.request_profiles.find_one({"id": profile_id}, {"_id": 0})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
 @app.get("/api/departments")
-async def get_departments():
-    return {"departments": DEPARTMENTS}
+async def get_departments(if_none_match: Optional[str] = Header(None)):
+    async def build():
+        return {"departments": DEPARTMENTS}
+    
+    return await cached_json_response(
+        ("departments", tuple(DEPARTMENTS)), if_none_match, f"public, max-age={REFERENCE_DATA_MAX_AGE_SECONDS}", build
+    )
 
 @app.get("/api/units")
-async def get_units():
-    return {"units": UNITS}
+async def get_units(if_none_match: Optional[str] = Header(None)):
+    async def build():
+        return {"units": UNITS}
+    
+    return await cached_json_response(
+        ("units", tuple(UNITS)), if_none_match, f"public, max-age={REFERENCE_DATA_MAX_AGE_SECONDS}", build
+    )
 
 @app.post("/api/student/register")
 async def register_student(student: StudentRegister):
@@ -183,7 +2421,7 @@ async def register_student(student: StudentRegister):
         raise HTTPException(status_code=400, detail="Invalid department")
     
     # Check if student already exists
-    existing = db.students.find_one({
+    existing = await db.students.find_one({
         "$or": [
             {"register_number": student.register_number},
             {"email": student.email}
@@ -201,20 +2439,63 @@ async def register_student(student: StudentRegister):
         "year": student.year,
         "semester": student.semester,
         "email": student.email,
-        "password": hash_password(student.password),
+        "password": await password_hasher.hash(student.password),
         "created_at": datetime.utcnow()
     }
     
-    db.students.insert_one(student_data)
+    await db.students.insert_one(student_data)
     return {"message": "Student registered successfully", "student_id": student_data["id"]}
 
+@app.post("/api/staff/students/import")
+async def import_students(file: UploadFile = File(...), current_user: dict = Depends(verify_token)):
+    """Bulk-register students from a CSV/XLSX roster; duplicates are rejected by the unique indexes"""
+    if current_user["user_type"] != "staff":
+        raise HTTPException(status_code=403, detail="Only staff can import students")
+    
+    inserted, duplicates, invalid, errors = 0, 0, 0, []
+    first_row = 2
+    async for frame in read_upload_frames(file):
+        records, row_numbers, row_errors = parse_roster_frame(frame, first_row)
+        first_row += len(frame)
+        invalid += len(row_errors)
+        errors.extend(row_errors[:IMPORT_MAX_ERRORS - len(errors)])
+        
+        hashes = await password_hasher.hash_many([record["password"] for record in records], ROSTER_PASSWORD_HASH_ROUNDS)
+        now = datetime.utcnow()
+        documents = [
+            {"id": str(uuid.uuid4()), **record, "password": hashed, "created_at": now}
+            for record, hashed in zip(records, hashes)
+        ]
+        count, write_errors = await insert_unordered(db.students, documents)
+        inserted += count
+        
+        for write_error in write_errors:
+            field = duplicate_key_field(write_error, ["register_number", "email"])
+            if write_error.get("code") == 11000:
+                duplicates += 1
+                message = f"{field} already registered" if field else "Student already exists"
+            else:
+                invalid += 1
+                message = write_error.get("errmsg", "Insert failed")
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"row": row_numbers[write_error["index"]], "errors": [message]})
+    
+    return {
+        "message": f"Imported {inserted} students",
+        "inserted": inserted,
+        "duplicates": duplicates,
+        "invalid": invalid,
+        "errors": errors,
+        "errors_truncated": duplicates + invalid > len(errors)
+    }
+
 @app.post("/api/staff/register")
 async def register_staff(staff: StaffRegister):
     if staff.department not in DEPARTMENTS:
         raise HTTPException(status_code=400, detail="Invalid department")
     
     # Check if staff already exists
-    existing = db.staff.find_one({"email": staff.email})
+    existing = await db.staff.find_one({"email": staff.email})
     if existing:
         raise HTTPException(status_code=400, detail="Staff already exists")
     
@@ -224,32 +2505,41 @@ async def register_staff(staff: StaffRegister):
         "department": staff.department,
         "academic_year": staff.academic_year,
         "email": staff.email,
-        "password": hash_password(staff.password),
+        "password": await password_hasher.hash(staff.password),
         "created_at": datetime.utcnow()
     }
     
-    db.staff.insert_one(staff_data)
+    await db.staff.insert_one(staff_data)
     return {"message": "Staff registered successfully", "staff_id": staff_data["id"]}
 
 @app.post("/api/login")
 async def login(login_data: LoginRequest):
     if login_data.user_type == "student":
-        user = db.students.find_one({"register_number": login_data.identifier})
+        user = await db.students.find_one({"register_number": login_data.identifier})
         collection = "students"
     elif login_data.user_type == "staff":
-        user = db.staff.find_one({"email": login_data.identifier})
+        user = await db.staff.find_one({"email": login_data.identifier})
         collection = "staff"
     else:
         raise HTTPException(status_code=400, detail="Invalid user type")
     
-    if not user or user["password"] != hash_password(login_data.password):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    valid, upgraded_hash = await password_hasher.verify(login_data.password, user["password"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    # Transparently upgrade legacy SHA-256 hashes (and hashes with outdated rounds)
+    if upgraded_hash:
+        await db[collection].update_one({"id": user["id"]}, {"$set": {"password": upgraded_hash}})
+    
     token_data = {
         "user_id": user["id"],
         "user_type": login_data.user_type,
         "name": user["name"],
-        "email": user["email"]
+        "email": user["email"],
+        "profile": profile_claims(user, login_data.user_type)
     }
     
     token = create_access_token(token_data)
@@ -283,22 +2573,31 @@ async def create_subject(subject: SubjectCreate, current_user: dict = Depends(ve
         "created_at": datetime.utcnow()
     }
     
-    db.subjects.insert_one(subject_data)
+    await db.subjects.insert_one(subject_data)
+    await bump_collection_version("subjects")
     return {"message": "Subject created successfully", "subject_id": subject_data["id"]}
 
 @app.get("/api/subjects")
-async def get_subjects(department: str = None, current_user: dict = Depends(verify_token)):
+async def get_subjects(department: str = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                       fields: Optional[str] = None, if_none_match: Optional[str] = Header(None),
+                       current_user: dict = Depends(current_principal)):
     query = {}
     if current_user["user_type"] == "staff":
         # Staff sees subjects from their department
-        staff = db.staff.find_one({"id": current_user["user_id"]})
+        staff = current_user["profile"]
         if staff:
             query["department"] = staff["department"]
     elif department:
         query["department"] = department
     
-    subjects = list(db.subjects.find(query, {"_id": 0}))
-    return {"subjects": subjects}
+    async def build():
+        subjects, next_cursor = await paginate(db.subjects, query, field_projection(fields), limit, cursor)
+        return {"subjects": subjects, "next_cursor": next_cursor}
+    
+    # Revalidated on every load, but a match costs one version read instead of a query plus encode
+    version = await get_collection_version("subjects")
+    key = ("subjects", version, query.get("department"), limit, cursor, fields)
+    return await cached_json_response(key, if_none_match, "private, no-cache", build)
 
 @app.post("/api/staff/questions")
 async def create_question(question: QuestionCreate, current_user: dict = Depends(verify_token)):
@@ -306,7 +2605,7 @@ async def create_question(question: QuestionCreate, current_user: dict = Depends
         raise HTTPException(status_code=403, detail="Only staff can create questions")
     
     # Verify subject exists
-    subject = db.subjects.find_one({"id": question.subject_id})
+    subject = await db.subjects.find_one({"id": question.subject_id})
     if not subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     
@@ -327,11 +2626,60 @@ async def create_question(question: QuestionCreate, current_user: dict = Depends
         "created_at": datetime.utcnow()
     }
     
-    db.questions.insert_one(question_data)
+    await db.questions.insert_one(question_data)
+    question_pool_cache.invalidate_subject(question.subject_id)
+    answer_key_cache.invalidate_subject(question.subject_id)
+    item_analysis_cache.invalidate_subject(question.subject_id)
     return {"message": "Question created successfully", "question_id": question_data["id"]}
 
+@app.post("/api/staff/questions/import")
+async def import_questions(subject_id: str = Form(...), file: UploadFile = File(...),
+                           current_user: dict = Depends(verify_token)):
+    """Bulk-create questions for one subject from a CSV/XLSX question bank"""
+    if current_user["user_type"] != "staff":
+        raise HTTPException(status_code=403, detail="Only staff can create questions")
+    
+    subject = await db.subjects.find_one({"id": subject_id}, {"_id": 0, "id": 1})
+    if not subject:
+        raise HTTPException(status_code=404, detail="Subject not found")
+    
+    inserted, invalid, errors = 0, 0, []
+    first_row = 2
+    async for frame in read_upload_frames(file):
+        records, row_numbers, row_errors = parse_question_frame(frame, first_row)
+        first_row += len(frame)
+        invalid += len(row_errors)
+        errors.extend(row_errors[:IMPORT_MAX_ERRORS - len(errors)])
+        
+        now = datetime.utcnow()
+        documents = [
+            {"id": str(uuid.uuid4()), **record, "subject_id": subject_id,
+             "created_by": current_user["user_id"], "created_at": now}
+            for record in records
+        ]
+        count, write_errors = await insert_unordered(db.questions, documents)
+        inserted += count
+        
+        invalid += len(write_errors)
+        for write_error in write_errors:
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"row": row_numbers[write_error["index"]], "errors": [write_error.get("errmsg", "Insert failed")]})
+    
+    if inserted:
+        question_pool_cache.invalidate_subject(subject_id)
+        answer_key_cache.invalidate_subject(subject_id)
+        item_analysis_cache.invalidate_subject(subject_id)
+    return {
+        "message": f"Imported {inserted} questions",
+        "inserted": inserted,
+        "invalid": invalid,
+        "errors": errors,
+        "errors_truncated": invalid > len(errors)
+    }
+
 @app.get("/api/staff/questions")
-async def get_staff_questions(subject_id: str = None, current_user: dict = Depends(verify_token)):
+async def get_staff_questions(subject_id: str = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                              fields: Optional[str] = None, current_user: dict = Depends(verify_token)):
     if current_user["user_type"] != "staff":
         raise HTTPException(status_code=403, detail="Only staff can view questions")
     
@@ -339,21 +2687,21 @@ async def get_staff_questions(subject_id: str = None, current_user: dict = Depen
     if subject_id:
         query["subject_id"] = subject_id
     
-    questions = list(db.questions.find(query, {"_id": 0}))
-    return {"questions": questions}
+    questions, next_cursor = await paginate(db.questions, query, field_projection(fields), limit, cursor)
+    return {"questions": questions, "next_cursor": next_cursor}
 
 @app.post("/api/staff/tests")
-async def create_test(test: TestCreate, current_user: dict = Depends(verify_token)):
+async def create_test(test: TestCreate, current_user: dict = Depends(current_principal)):
     if current_user["user_type"] != "staff":
         raise HTTPException(status_code=403, detail="Only staff can create tests")
     
     # Verify subject exists and belongs to staff's department
-    subject = db.subjects.find_one({"id": test.subject_id})
+    subject = await db.subjects.find_one({"id": test.subject_id})
     if not subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     
-    staff = db.staff.find_one({"id": current_user["user_id"]})
-    if subject["department"] != staff["department"]:
+    staff = current_user["profile"]
+    if not staff or subject["department"] != staff["department"]:
         raise HTTPException(status_code=403, detail="Can only create tests for your department")
     
     test_data = {
@@ -365,39 +2713,41 @@ async def create_test(test: TestCreate, current_user: dict = Depends(verify_toke
         "duration_minutes": test.duration_minutes,
         "target_year": test.target_year,
         "target_semester": test.target_semester,
+        "question_count": test.question_count,
         "department": subject["department"],
         "created_by": current_user["user_id"],
         "created_at": datetime.utcnow(),
         "is_active": True
     }
     
-    db.tests.insert_one(test_data)
+    await db.tests.insert_one(test_data)
     return {"message": "Test created successfully", "test_id": test_data["id"]}
 
 @app.get("/api/student/available-tests")
-async def get_available_tests(current_user: dict = Depends(verify_token)):
+async def get_available_tests(current_user: dict = Depends(current_principal)):
     if current_user["user_type"] != "student":
         raise HTTPException(status_code=403, detail="Only students can view available tests")
     
     current_time = datetime.utcnow()
     
     # Get student info to filter by department and year
-    student = db.students.find_one({"id": current_user["user_id"]})
+    student = current_user["profile"]
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
     # Find active tests for student's department and year
     available_tests = []
-    tests = db.tests.find({
+    tests = await db.tests.find({
         "is_active": True,
         "start_date": {"$lte": current_time},
         "end_date": {"$gte": current_time},
         "department": student["department"],
         "target_year": student["year"]
-    })
+    }).to_list(length=None)
+    subjects = await fetch_by_ids(db.subjects, [test["subject_id"] for test in tests], SUBJECT_SUMMARY_PROJECTION)
     
     for test in tests:
-        subject = db.subjects.find_one({"id": test["subject_id"]})
+        subject = subjects.get(test["subject_id"])
         if subject:
             available_tests.append({
                 "id": test["id"],
@@ -413,12 +2763,12 @@ async def get_available_tests(current_user: dict = Depends(verify_token)):
     return {"tests": available_tests}
 
 @app.get("/api/test/{test_id}/questions")
-async def get_test_questions(test_id: str, current_user: dict = Depends(verify_token)):
+async def get_test_questions(test_id: str, current_user: dict = Depends(current_principal)):
     if current_user["user_type"] != "student":
         raise HTTPException(status_code=403, detail="Only students can take tests")
     
     # Verify test exists and is active
-    test = db.tests.find_one({"id": test_id, "is_active": True})
+    test = await db.tests.find_one({"id": test_id, "is_active": True})
     if not test:
         raise HTTPException(status_code=404, detail="Test not found or inactive")
     
@@ -428,7 +2778,7 @@ async def get_test_questions(test_id: str, current_user: dict = Depends(verify_t
         raise HTTPException(status_code=400, detail="Test is not currently active")
     
     # Verify student is eligible (department and year match)
-    student = db.students.find_one({"id": current_user["user_id"]})
+    student = current_user["profile"]
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
@@ -436,32 +2786,12 @@ async def get_test_questions(test_id: str, current_user: dict = Depends(verify_t
         raise HTTPException(status_code=403, detail="You are not eligible for this test")
     
     # Track live session
-    if test_id not in live_sessions:
-        live_sessions[test_id] = {}
-    
-    live_sessions[test_id][current_user["user_id"]] = {
-        "student_name": student["name"],
-        "register_number": student["register_number"],
-        "start_time": datetime.utcnow(),
-        "current_question": 0,
-        "status": "active"
-    }
+    await live_session_store.start(test_id, current_user["user_id"], student["name"], student["register_number"])
     
-    # Get questions for the subject (randomized order per student)
-    import random
-    questions = list(db.questions.find({"subject_id": test["subject_id"]}, {"_id": 0}))
-    
-    # Shuffle questions based on student ID for consistent randomization
-    random.seed(current_user["user_id"])
-    random.shuffle(questions)
-    
-    # Limit to 25 questions
-    questions = questions[:25]
-    
-    # Remove correct answers and explanations from response
-    for question in questions:
-        del question["correct_answer"]
-        del question["explanation"]
+    # Select this student's paper deterministically, then fetch only those questions
+    pool = await get_question_pool(test)
+    paper_ids = select_paper_ids(test_id, current_user["user_id"], pool.question_ids, test.get("question_count", 25))
+    questions = await load_paper(pool, paper_ids)
     
     return {
         "test_id": test_id,
@@ -469,52 +2799,104 @@ async def get_test_questions(test_id: str, current_user: dict = Depends(verify_t
         "duration_minutes": test["duration_minutes"]
     }
 
+@app.post("/api/test/{test_id}/heartbeat")
+async def test_heartbeat(test_id: str, heartbeat: Heartbeat, current_user: dict = Depends(verify_token)):
+    if current_user["user_type"] != "student":
+        raise HTTPException(status_code=403, detail="Only students can send heartbeats")
+    
+    if not await live_session_store.heartbeat(test_id, current_user["user_id"], heartbeat.current_question, heartbeat.status):
+        raise HTTPException(status_code=404, detail="No active session for this test")
+    return {"status": "ok"}
+
+@app.post("/api/test/{test_id}/autosave")
+async def autosave_answers(test_id: str, autosave: AnswerAutosave, current_user: dict = Depends(verify_token)):
+    if current_user["user_type"] != "student":
+        raise HTTPException(status_code=403, detail="Only students can save answers")
+    
+    # Only a test the student is currently sitting can collect a draft
+    if not await live_session_store.is_active(test_id, current_user["user_id"]):
+        raise HTTPException(status_code=409, detail="No active session for this test")
+    
+    answer_key = await get_answer_key_for_test_id(test_id)
+    if answer_key is None:
+        raise HTTPException(status_code=404, detail="Test not found")
+    # Answer keys become field paths in the draft, so only the test's own question ids are accepted
+    unknown = [qid for qid in autosave.answers if qid not in answer_key.positions]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Questions not in this test: {', '.join(unknown)}")
+    check_selected_options(answer_key, autosave.answers)
+    
+    autosave_buffer.record(test_id, current_user["user_id"], autosave.answers, autosave.tab_switches)
+    return {"status": "saved"}
+
+@app.get("/api/test/{test_id}/draft")
+async def get_draft_answers(test_id: str, current_user: dict = Depends(verify_token)):
+    if current_user["user_type"] != "student":
+        raise HTTPException(status_code=403, detail="Only students can view their draft")
+    
+    draft = await db.draft_attempts.find_one({"test_id": test_id, "student_id": current_user["user_id"]}, {"_id": 0})
+    pending = autosave_buffer.pending(test_id, current_user["user_id"]) or {"answers": {}, "tab_switches": None}
+    return {
+        "answers": {**(draft or {}).get("answers", {}), **pending["answers"]},
+        "tab_switches": max((draft or {}).get("tab_switches", 0), pending["tab_switches"] or 0)
+    }
+
 @app.post("/api/test/submit")
-async def submit_test(attempt: TestAttempt, current_user: dict = Depends(verify_token)):
+async def submit_test(attempt: TestAttempt, current_user: dict = Depends(current_principal)):
     if current_user["user_type"] != "student":
         raise HTTPException(status_code=403, detail="Only students can submit tests")
     
-    # Calculate score and unit-wise performance
-    questions = list(db.questions.find({"id": {"$in": list(attempt.answers.keys())}}))
-    correct_count = 0
-    unit_performance = defaultdict(lambda: {"correct": 0, "total": 0})
+    test = await db.tests.find_one({"id": attempt.test_id})
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
     
-    for question in questions:
-        is_correct = attempt.answers.get(question["id"]) == question["correct_answer"]
-        if is_correct:
-            correct_count += 1
-        
-        # Track unit-wise performance
-        for unit in question.get("units", []):
-            unit_performance[unit]["total"] += 1
-            if is_correct:
-                unit_performance[unit]["correct"] += 1
+    answer_key = await get_answer_key(test)
+    check_selected_options(answer_key, attempt.answers)
+    
+    # Finalize from the autosaved draft; answers in the submission itself win. The draft is only
+    # discarded once the attempt is stored, so a failure below leaves the autosaved answers intact.
+    pending = autosave_buffer.pending(attempt.test_id, current_user["user_id"]) or {"answers": {}, "tab_switches": None}
+    draft = await db.draft_attempts.find_one({"test_id": attempt.test_id, "student_id": current_user["user_id"]})
+    answers = {**(draft or {}).get("answers", {}), **pending["answers"], **attempt.answers}
+    tab_switches = max(attempt.tab_switches, (draft or {}).get("tab_switches", 0), pending["tab_switches"] or 0)
+    
+    # Calculate score and unit-wise performance against the compiled answer key
+    scores, totals, unit_correct, unit_total = answer_key.grade([answers])
+    correct_count = int(scores[0])
+    total_questions = int(totals[0])
+    unit_performance = unit_performance_from_row(unit_correct[0], unit_total[0])
     
     attempt_data = {
         "id": str(uuid.uuid4()),
         "test_id": attempt.test_id,
         "student_id": current_user["user_id"],
-        "answers": attempt.answers,
+        "answers": answers,
         "score": correct_count,
-        "total_questions": len(questions),
-        "tab_switches": attempt.tab_switches,
+        "total_questions": total_questions,
+        "tab_switches": tab_switches,
         "is_malpractice": attempt.is_malpractice,
-        "unit_performance": dict(unit_performance),
+        "unit_performance": unit_performance,
         "completion_time": attempt.completion_time or datetime.utcnow(),
         "submitted_at": datetime.utcnow()
     }
     
-    db.test_attempts.insert_one(attempt_data)
+    await db.test_attempts.insert_one(attempt_data)
+    autosave_buffer.pop(attempt.test_id, current_user["user_id"])
+    await db.draft_attempts.delete_one({"test_id": attempt.test_id, "student_id": current_user["user_id"]})
+    await db.test_insights.update_one(
+        {"test_id": attempt.test_id},
+        {"$inc": insight_increments(correct_count, total_questions, attempt.is_malpractice, unit_performance),
+         "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
     
     # Remove from live sessions
-    if attempt.test_id in live_sessions and current_user["user_id"] in live_sessions[attempt.test_id]:
-        del live_sessions[attempt.test_id][current_user["user_id"]]
+    await live_session_store.end(attempt.test_id, current_user["user_id"])
     
-    # Send email notification
-    student = db.students.find_one({"id": current_user["user_id"]})
+    # Queue email notification (delivered by the background dispatcher)
+    student = current_user["profile"]
     if student and student.get("email"):
-        test = db.tests.find_one({"id": attempt.test_id})
-        subject_obj = db.subjects.find_one({"id": test["subject_id"]}) if test else None
+        subject_obj = await db.subjects.find_one({"id": test["subject_id"]})
         
         email_subject = f"Test Completed - {subject_obj['name'] if subject_obj else 'MCQ Test'}"
         email_body = f"""
@@ -527,7 +2909,7 @@ async def submit_test(attempt: TestAttempt, current_user: dict = Depends(verify_
             <h3>Test Details:</h3>
             <ul>
                 <li><strong>Subject:</strong> {subject_obj['name'] if subject_obj else 'N/A'}</li>
-                <li><strong>Score:</strong> {correct_count}/{len(questions)} ({round((correct_count/len(questions))*100, 2)}%)</li>
+                <li><strong>Score:</strong> {correct_count}/{total_questions} ({round((correct_count/total_questions)*100, 2) if total_questions else 0}%)</li>
                 <li><strong>Status:</strong> {'Malpractice Detected' if attempt.is_malpractice else 'Completed Successfully'}</li>
                 <li><strong>Submitted At:</strong> {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}</li>
             </ul>
@@ -539,25 +2921,59 @@ async def submit_test(attempt: TestAttempt, current_user: dict = Depends(verify_
         </html>
         """
         
-        await send_email(student["email"], email_subject, email_body)
+        await enqueue_email(student["email"], email_subject, email_body)
     
     return {
         "message": "Test submitted successfully",
         "score": correct_count,
-        "total": len(questions),
+        "total": total_questions,
         "is_malpractice": attempt.is_malpractice,
         "attempt_id": attempt_data["id"]
     }
 
+@app.post("/api/staff/tests/{test_id}/regrade")
+async def regrade_test(test_id: str, current_user: dict = Depends(verify_token)):
+    """Rescore every attempt of a test against a freshly compiled answer key"""
+    if current_user["user_type"] != "staff":
+        raise HTTPException(status_code=403, detail="Only staff can regrade tests")
+    
+    test = await db.tests.find_one({"id": test_id})
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+    if test_in_progress(test):
+        raise HTTPException(status_code=409, detail="Test is in progress; regrade it after it ends")
+    
+    answer_key_cache.invalidate_test(test_id)
+    answer_key = await get_answer_key(test)
+    
+    attempts = await db.test_attempts.find({"test_id": test_id}, {"_id": 0, "id": 1, "answers": 1}).to_list(length=None)
+    if not attempts:
+        return {"message": "No attempts found for this test", "regraded": 0}
+    
+    scores, totals, unit_correct, unit_total = answer_key.grade([a["answers"] for a in attempts])
+    updates = [
+        UpdateOne({"id": a["id"]}, {"$set": {
+            "score": int(scores[i]),
+            "total_questions": int(totals[i]),
+            "unit_performance": unit_performance_from_row(unit_correct[i], unit_total[i])
+        }})
+        for i, a in enumerate(attempts)
+    ]
+    for start in range(0, len(updates), 1000):
+        await db.test_attempts.bulk_write(updates[start:start + 1000], ordered=False)
+    await rebuild_test_insights(test_id)
+    
+    return {"message": "Test regraded successfully", "regraded": len(attempts)}
+
 @app.get("/api/student/results/{attempt_id}")
 async def get_test_results(attempt_id: str, current_user: dict = Depends(verify_token)):
-    attempt = db.test_attempts.find_one({"id": attempt_id, "student_id": current_user["user_id"]})
+    attempt = await db.test_attempts.find_one({"id": attempt_id, "student_id": current_user["user_id"]})
     if not attempt:
         raise HTTPException(status_code=404, detail="Test attempt not found")
     
     # Get questions with correct answers
     question_ids = list(attempt["answers"].keys())
-    questions = list(db.questions.find({"id": {"$in": question_ids}}))
+    questions = await db.questions.find({"id": {"$in": question_ids}}).to_list(length=None)
     
     results = []
     for question in questions:
@@ -582,92 +2998,190 @@ async def get_test_results(attempt_id: str, current_user: dict = Depends(verify_
     }
 
 @app.get("/api/staff/test-results/{test_id}")
-async def get_staff_test_results(test_id: str, current_user: dict = Depends(verify_token)):
+async def get_staff_test_results(test_id: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                                 fields: Optional[str] = None, current_user: dict = Depends(verify_token)):
     if current_user["user_type"] != "staff":
         raise HTTPException(status_code=403, detail="Only staff can view test results")
     
-    attempts = list(db.test_attempts.find({"test_id": test_id}))
+    attempts, next_cursor = await paginate(db.test_attempts, {"test_id": test_id}, {"answers": 0}, limit, cursor)
+    students = await fetch_by_ids(db.students, [attempt["student_id"] for attempt in attempts], STUDENT_SUMMARY_PROJECTION)
+    selected_fields = list(field_projection(fields))
     results = []
     
     for attempt in attempts:
-        student = db.students.find_one({"id": attempt["student_id"]})
+        student = students.get(attempt["student_id"])
         if student:
-            results.append({
-                "student_name": student["name"],
-                "register_number": student["register_number"],
-                "email": student["email"],
-                "department": student["department"],
-                "year": student["year"],
-                "score": attempt["score"],
-                "total": attempt["total_questions"],
-                "percentage": round((attempt["score"] / attempt["total_questions"]) * 100, 2),
-                "is_malpractice": attempt["is_malpractice"],
-                "tab_switches": attempt["tab_switches"],
-                "unit_performance": attempt.get("unit_performance", {}),
-                "submitted_at": attempt["submitted_at"]
-            })
+            row = result_row(attempt, student)
+            if selected_fields:
+                row = {field: row[field] for field in selected_fields if field in row}
+            results.append(row)
     
-    return {"results": results}
+    return {"results": results, "next_cursor": next_cursor}
+
+@app.get("/api/staff/test-results/{test_id}/export")
+async def export_test_results(test_id: str, format: str = "csv", current_user: dict = Depends(verify_token)):
+    """Stream a test's results as CSV (chunked as rows arrive) or XLSX (written in bounded-memory batches)"""
+    if current_user["user_type"] != "staff":
+        raise HTTPException(status_code=403, detail="Only staff can export test results")
+    
+    if format == "csv":
+        return StreamingResponse(
+            stream_results_csv(test_id),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="test_results_{test_id}.csv"'}
+        )
+    if format == "xlsx":
+        return StreamingResponse(
+            stream_results_xlsx(test_id),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": f'attachment; filename="test_results_{test_id}.xlsx"'}
+        )
+    raise HTTPException(status_code=400, detail="Invalid format, expected csv or xlsx")
 
 @app.get("/api/staff/live-status/{test_id}")
 async def get_live_test_status(test_id: str, current_user: dict = Depends(verify_token)):
     if current_user["user_type"] != "staff":
         raise HTTPException(status_code=403, detail="Only staff can view live status")
     
-    live_students = live_sessions.get(test_id, {})
-    return {"live_students": list(live_students.values())}
+    live_students = await live_session_store.list(test_id)
+    return {"live_students": live_students}
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+async def stream_live_status(request: Request, monitor: LiveMonitor, subscriber: LiveMonitorSubscriber):
+    try:
+        await monitor.ready.wait()
+        while not await request.is_disconnected():
+            if subscriber.needs_snapshot:
+                subscriber.needs_snapshot = False
+                yield sse_event("snapshot", monitor.snapshot())
+                continue
+            try:
+                delta = await asyncio.wait_for(subscriber.queue.get(), timeout=LIVE_MONITOR_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield sse_event("delta", delta)
+    finally:
+        monitor.unsubscribe(subscriber)
+
+@app.post("/api/staff/live-status/{test_id}/stream-token")
+async def issue_live_stream_token(test_id: str, current_user: dict = Depends(verify_token)):
+    if current_user["user_type"] != "staff":
+        raise HTTPException(status_code=403, detail="Only staff can view live status")
+    
+    return {"token": create_stream_token(current_user["user_id"], test_id), "expires_in": LIVE_STREAM_TOKEN_TTL_SECONDS}
+
+@app.get("/api/staff/live-status/{test_id}/stream")
+async def stream_live_test_status(test_id: str, request: Request, token: str):
+    """Server-Sent Events: a snapshot of live students, then coalesced deltas every tick
+    
+    EventSource cannot set headers and its URL ends up in access logs, so the
+    query parameter carries a short-lived token from the stream-token endpoint
+    rather than the login token. It is only checked when the stream opens.
+    """
+    decode_stream_token(token, test_id)
+    
+    monitor = live_monitor_hub.monitor(test_id)
+    subscriber = monitor.subscribe()
+    return StreamingResponse(
+        stream_live_status(request, monitor, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/api/staff/test-insights/{test_id}")
 async def get_test_insights(test_id: str, current_user: dict = Depends(verify_token)):
     if current_user["user_type"] != "staff":
         raise HTTPException(status_code=403, detail="Only staff can view test insights")
     
-    attempts = list(db.test_attempts.find({"test_id": test_id}))
+    insight = await db.test_insights.find_one({"test_id": test_id})
+    if insight is None and await db.test_attempts.find_one({"test_id": test_id}, {"_id": 1}):
+        # Attempts submitted before aggregates were maintained; build it once from them
+        insight = await rebuild_test_insights(test_id)
     
-    if not attempts:
+    if not insight or not insight.get("attempt_count"):
         return {"message": "No attempts found for this test"}
     
-    # Overall statistics
-    total_attempts = len(attempts)
-    total_score = sum(attempt["score"] for attempt in attempts)
-    average_score = total_score / total_attempts
-    malpractice_count = sum(1 for attempt in attempts if attempt["is_malpractice"])
-    
-    # Unit-wise performance
-    unit_stats = defaultdict(lambda: {"total_questions": 0, "correct_answers": 0, "attempts": 0})
-    
-    for attempt in attempts:
-        unit_perf = attempt.get("unit_performance", {})
-        for unit, perf in unit_perf.items():
-            unit_stats[unit]["total_questions"] += perf["total"]
-            unit_stats[unit]["correct_answers"] += perf["correct"]
-            unit_stats[unit]["attempts"] += 1
+    # Overall statistics from the incrementally maintained aggregate
+    total_attempts = insight["attempt_count"]
+    average_score = insight["score_sum"] / total_attempts
+    variance = max(insight["score_sq_sum"] / total_attempts - average_score ** 2, 0)
+    malpractice_count = insight["malpractice_count"]
     
     # Calculate unit-wise percentages
     unit_insights = {}
-    for unit, stats in unit_stats.items():
-        if stats["total_questions"] > 0:
+    for unit, stats in insight.get("units", {}).items():
+        if stats["total"] > 0:
             unit_insights[unit] = {
-                "average_percentage": round((stats["correct_answers"] / stats["total_questions"]) * 100, 2),
-                "total_questions": stats["total_questions"],
+                "average_percentage": round((stats["correct"] / stats["total"]) * 100, 2),
+                "total_questions": stats["total"],
                 "total_attempts": stats["attempts"]
             }
     
     return {
         "total_attempts": total_attempts,
         "average_score": round(average_score, 2),
-        "average_percentage": round((average_score / attempts[0]["total_questions"]) * 100, 2),
+        "score_std_dev": round(variance ** 0.5, 2),
+        "average_percentage": round((insight["score_sum"] / insight["total_questions_sum"]) * 100, 2) if insight["total_questions_sum"] else 0,
         "malpractice_count": malpractice_count,
         "malpractice_percentage": round((malpractice_count / total_attempts) * 100, 2),
         "unit_insights": unit_insights
     }
 
+@app.get("/api/staff/test-item-analysis/{test_id}")
+async def get_test_item_analysis(test_id: str, current_user: dict = Depends(verify_token)):
+    if current_user["user_type"] != "staff":
+        raise HTTPException(status_code=403, detail="Only staff can view item analysis")
+    
+    test = await db.tests.find_one({"id": test_id})
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+    
+    # The insight aggregate's updated_at changes on every submission and regrade
+    insight = await db.test_insights.find_one({"test_id": test_id}, {"_id": 0, "updated_at": 1})
+    version = insight["updated_at"] if insight else None
+    cached = item_analysis_cache.get(test_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    
+    answer_key = await get_answer_key(test)
+    attempts = await db.test_attempts.find({"test_id": test_id}, {"_id": 0, "answers": 1}).to_list(length=None)
+    questions = await db.questions.find(
+        {"subject_id": test["subject_id"]}, {"_id": 0, "id": 1, "question_text": 1, "options": 1}
+    ).to_list(length=None)
+    option_counts = {q["id"]: len(q.get("options", [])) for q in questions}
+    question_texts = {q["id"]: q.get("question_text") for q in questions}
+    
+    items = await asyncio.to_thread(
+        compute_item_analysis, answer_key, [a["answers"] for a in attempts], option_counts
+    )
+    for item in items:
+        item["question_text"] = question_texts.get(item["question_id"])
+    
+    result = {"test_id": test_id, "total_attempts": len(attempts), "items": items}
+    item_analysis_cache.set(test_id, test["subject_id"], (version, result))
+    return result
+
+@app.post("/api/staff/test-insights/{test_id}/rebuild")
+async def rebuild_insights(test_id: str, current_user: dict = Depends(verify_token)):
+    if current_user["user_type"] != "staff":
+        raise HTTPException(status_code=403, detail="Only staff can rebuild test insights")
+    
+    test = await db.tests.find_one({"id": test_id}, {"_id": 0, "is_active": 1, "start_date": 1, "end_date": 1})
+    if test and test_in_progress(test):
+        raise HTTPException(status_code=409, detail="Test is in progress; rebuild its insights after it ends")
+    
+    insight = await rebuild_test_insights(test_id)
+    return {"message": "Test insights rebuilt successfully", "total_attempts": insight.get("attempt_count", 0)}
+
 @app.get("/api/student/test-insights/{attempt_id}")
 async def get_student_test_insights(attempt_id: str, current_user: dict = Depends(verify_token)):
     if current_user["user_type"] != "student":
         raise HTTPException(status_code=403, detail="Only students can view their insights")
     
-    attempt = db.test_attempts.find_one({"id": attempt_id, "student_id": current_user["user_id"]})
+    attempt = await db.test_attempts.find_one({"id": attempt_id, "student_id": current_user["user_id"]})
     if not attempt:
         raise HTTPException(status_code=404, detail="Test attempt not found")
     
@@ -692,20 +3206,35 @@ async def get_student_test_insights(attempt_id: str, current_user: dict = Depend
     }
 
 @app.get("/api/staff/tests")
-async def get_staff_tests(current_user: dict = Depends(verify_token)):
+async def get_staff_tests(limit: Optional[int] = None, cursor: Optional[str] = None, fields: Optional[str] = None,
+                          current_user: dict = Depends(verify_token)):
     if current_user["user_type"] != "staff":
         raise HTTPException(status_code=403, detail="Only staff can view their tests")
     
-    tests = list(db.tests.find({"created_by": current_user["user_id"]}, {"_id": 0}))
+    tests, next_cursor = await paginate(
+        db.tests, {"created_by": current_user["user_id"]}, field_projection(fields, ["subject_id"]), limit, cursor
+    )
+    subjects = await fetch_by_ids(db.subjects, [test["subject_id"] for test in tests], SUBJECT_SUMMARY_PROJECTION)
     
     for test in tests:
-        subject = db.subjects.find_one({"id": test["subject_id"]})
+        subject = subjects.get(test["subject_id"])
         if subject:
             test["subject_name"] = subject["name"]
             test["course_code"] = subject["course_code"]
     
-    return {"tests": tests}
+    return {"tests": tests, "next_cursor": next_cursor}
+
+async def rebuild_all_test_insights(test_ids: List[str]):
+    if not test_ids:
+        test_ids = await db.test_attempts.distinct("test_id")
+    for test_id in test_ids:
+        insight = await rebuild_test_insights(test_id)
+        print(f"Rebuilt insights for {test_id}: {insight.get('attempt_count', 0)} attempts")
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild-insights":
+        # python server.py rebuild-insights [test_id ...]
+        asyncio.run(rebuild_all_test_insights(sys.argv[2:]))
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
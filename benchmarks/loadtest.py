@@ -0,0 +1,323 @@
+"""Exam-start load test: boot the API locally, seed a cohort and replay the student exam lifecycle
+
+Each simulated student logs in, lists available tests, fetches their paper and
+submits it. Students arrive on a configurable curve: everyone at once
+("burst", the bell at exam start), evenly over --ramp-seconds ("ramp") or
+with exponential gaps ("poisson").
+
+    python benchmarks/loadtest.py --students 300 --arrival burst --report report.json
+    python benchmarks/loadtest.py --mongo-url mongodb://localhost:27017 --arrival ramp --ramp-seconds 30
+
+Without --mongo-url the app runs against an in-memory mongomock stand-in, which
+measures the application side only. With it, a throwaway database is seeded on
+that server and dropped afterwards. The report is JSON, so runs can be diffed
+between releases.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+import numpy as np
+import uvicorn
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import server  # noqa: E402
+
+PASSWORD = "loadtest-password"
+DEPARTMENT = "Computer Engineering"
+YEAR = 2
+ARRIVAL_CURVES = ("burst", "ramp", "poisson")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def seed(db, students: int, pool_size: int, question_count: int) -> dict:
+    """Insert one staff member, subject, question pool, live test and the student cohort"""
+    now = datetime.utcnow()
+    # Every student shares one full-strength hash, so logins cost what they do in production
+    password = server.hash_password_sync(PASSWORD, server.PASSWORD_HASH_ROUNDS)
+    staff_id, subject_id, test_id = (str(uuid.uuid4()) for _ in range(3))
+
+    await db.staff.insert_one({
+        "id": staff_id, "name": "Load Test Staff", "department": DEPARTMENT, "academic_year": "2026-2027",
+        "email": "loadtest-staff@example.com", "password": password, "created_at": now
+    })
+    await db.subjects.insert_one({
+        "id": subject_id, "name": "Load Test Subject", "course_code": "LT101", "department": DEPARTMENT,
+        "created_by": staff_id, "created_at": now
+    })
+    await db.questions.insert_many([
+        {
+            "id": str(uuid.uuid4()), "question_text": f"Load test question {i}",
+            "options": [f"Option {letter}" for letter in "ABCD"], "correct_answer": i % 4,
+            "explanation": "", "subject_id": subject_id, "units": [server.UNITS[i % len(server.UNITS)]],
+            "created_by": staff_id, "created_at": now
+        }
+        for i in range(pool_size)
+    ])
+    await db.tests.insert_one({
+        "id": test_id, "subject_id": subject_id, "category": "CAT",
+        "start_date": now - timedelta(minutes=5), "end_date": now + timedelta(hours=3),
+        "duration_minutes": 60, "target_year": YEAR, "target_semester": 3, "question_count": question_count,
+        "department": DEPARTMENT, "created_by": staff_id, "created_at": now, "is_active": True
+    })
+    register_numbers = [f"LT{i:06d}" for i in range(students)]
+    await db.students.insert_many([
+        {
+            "id": str(uuid.uuid4()), "name": f"Load Test Student {i}", "register_number": register_number,
+            "roll_number": str(i), "department": DEPARTMENT, "year": YEAR, "semester": 3,
+            "email": f"{register_number.lower()}@example.com", "password": password, "created_at": now
+        }
+        for i, register_number in enumerate(register_numbers)
+    ])
+    return {"test_id": test_id, "register_numbers": register_numbers}
+
+
+class LocalServer:
+    """Runs the app under uvicorn in a background thread with its own event loop"""
+
+    def __init__(self, mongo_url, seed_options: dict):
+        self.mongo_url = mongo_url
+        self.seed_options = seed_options
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.seeded = None
+        self.error = None
+        self._uvicorn = uvicorn.Server(uvicorn.Config(
+            server.app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on"
+        ))
+        self._thread = threading.Thread(target=self._run, name="loadtest-server", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        while not self._uvicorn.started:
+            if not self._thread.is_alive():
+                raise RuntimeError(f"Server failed to start: {self.error}")
+            time.sleep(0.05)
+
+    def stop(self):
+        self._uvicorn.should_exit = True
+        self._thread.join()
+
+    def _run(self):
+        try:
+            asyncio.run(self._serve())
+        except Exception as e:
+            self.error = e
+
+    async def _serve(self):
+        db_name = f"kongu_loadtest_{uuid.uuid4().hex[:8]}"
+        if self.mongo_url:
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            client = AsyncIOMotorClient(self.mongo_url)
+        else:
+            from mongomock_motor import AsyncMongoMockClient
+
+            client = AsyncMongoMockClient()
+        server.db = client[db_name]
+        try:
+            self.seeded = await seed(server.db, **self.seed_options)
+            await self._uvicorn.serve()
+        finally:
+            if self.mongo_url:
+                await client.drop_database(db_name)
+                client.close()
+
+
+class LifecycleError(Exception):
+    pass
+
+
+class Recorder:
+    """Collects (latency seconds, ok) samples per endpoint template"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    async def request(self, client: httpx.AsyncClient, endpoint: str, url: str, **kwargs) -> httpx.Response:
+        method = endpoint.split(" ", 1)[0]
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.samples[endpoint].append((time.perf_counter() - started, ok))
+        if not ok:
+            raise LifecycleError(endpoint)
+        return response
+
+
+def arrival_offsets(curve: str, count: int, ramp_seconds: float, rng: random.Random) -> list:
+    """Start delay in seconds for each simulated student"""
+    if curve == "burst" or ramp_seconds <= 0:
+        return [0.0] * count
+    if curve == "ramp":
+        return [ramp_seconds * i / count for i in range(count)]
+    offsets, elapsed = [], 0.0
+    for _ in range(count):
+        offsets.append(elapsed)
+        elapsed += rng.expovariate(count / ramp_seconds)
+    return offsets
+
+
+async def student_session(client: httpx.AsyncClient, recorder: Recorder, register_number: str,
+                          delay: float, think_seconds: float, rng: random.Random) -> bool:
+    """One student's exam: login, list tests, fetch the paper, answer and submit"""
+    await asyncio.sleep(delay)
+    try:
+        login = await recorder.request(client, "POST /api/login", "/api/login", json={
+            "identifier": register_number, "password": PASSWORD, "user_type": "student"
+        })
+        session = login.json()
+        headers = {"Authorization": f"Bearer {session['access_token']}"}
+
+        tests = await recorder.request(
+            client, "GET /api/student/available-tests", "/api/student/available-tests", headers=headers
+        )
+        available = tests.json()["tests"]
+        if not available:
+            raise LifecycleError("no available tests")
+        test_id = available[0]["id"]
+
+        paper = await recorder.request(
+            client, "GET /api/test/{test_id}/questions", f"/api/test/{test_id}/questions", headers=headers
+        )
+        questions = paper.json()["questions"]
+        if think_seconds > 0:
+            await asyncio.sleep(rng.uniform(0, 2 * think_seconds))
+
+        await recorder.request(client, "POST /api/test/submit", "/api/test/submit", headers=headers, json={
+            "test_id": test_id,
+            "student_id": session["user"]["id"],
+            "answers": {question["id"]: rng.randrange(len(question["options"])) for question in questions},
+            "tab_switches": 0,
+            "is_malpractice": False
+        })
+        return True
+    except LifecycleError:
+        return False
+
+
+def summarize(samples: dict, duration: float) -> dict:
+    endpoints = {}
+    for endpoint, entries in sorted(samples.items()):
+        latencies = np.array([latency for latency, _ in entries]) * 1000
+        errors = sum(1 for _, ok in entries if not ok)
+        endpoints[endpoint] = {
+            "requests": len(entries),
+            "errors": errors,
+            "error_rate": round(errors / len(entries), 4),
+            "throughput_rps": round(len(entries) / duration, 2),
+            "latency_ms": {
+                "p50": round(float(np.percentile(latencies, 50)), 2),
+                "p95": round(float(np.percentile(latencies, 95)), 2),
+                "p99": round(float(np.percentile(latencies, 99)), 2),
+                "mean": round(float(latencies.mean()), 2),
+                "max": round(float(latencies.max()), 2),
+            },
+        }
+    return endpoints
+
+
+async def drive(base_url: str, register_numbers: list, options) -> dict:
+    rng = random.Random(options.seed)
+    recorder = Recorder()
+    offsets = arrival_offsets(options.arrival, len(register_numbers), options.ramp_seconds, rng)
+    limits = httpx.Limits(max_connections=options.connections, max_keepalive_connections=options.connections)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=options.timeout) as client:
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(
+            student_session(client, recorder, register_number, delay, options.think_seconds,
+                            random.Random(f"{options.seed}:{register_number}"))
+            for register_number, delay in zip(register_numbers, offsets)
+        ))
+        duration = time.perf_counter() - started
+
+    completed = sum(outcomes)
+    return {
+        "duration_seconds": round(duration, 3),
+        "lifecycles": {
+            "started": len(outcomes),
+            "completed": completed,
+            "failed": len(outcomes) - completed,
+            "throughput_per_second": round(completed / duration, 2),
+        },
+        "endpoints": summarize(recorder.samples, duration),
+    }
+
+
+def run_loadtest(options) -> dict:
+    local = LocalServer(options.mongo_url, {
+        "students": options.students, "pool_size": options.pool_size, "question_count": options.question_count
+    })
+    local.start()
+    try:
+        result = asyncio.run(drive(local.base_url, local.seeded["register_numbers"], options))
+    finally:
+        local.stop()
+
+    config = {key: value for key, value in vars(options).items() if key not in ("report", "mongo_url")}
+    config["backend"] = "mongo" if options.mongo_url else "in-memory"
+    return {"started_at": datetime.utcnow().isoformat() + "Z", "config": config, **result}
+
+
+def print_summary(report: dict):
+    lifecycles = report["lifecycles"]
+    print(f"{lifecycles['completed']}/{lifecycles['started']} exams completed in {report['duration_seconds']}s "
+          f"({lifecycles['throughput_per_second']}/s)", file=sys.stderr)
+    print(f"{'endpoint':<36} {'reqs':>6} {'err%':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}", file=sys.stderr)
+    for endpoint, stats in report["endpoints"].items():
+        latency = stats["latency_ms"]
+        print(f"{endpoint:<36} {stats['requests']:>6} {stats['error_rate'] * 100:>6.1f} {stats['throughput_rps']:>8} "
+              f"{latency['p50']:>8} {latency['p95']:>8} {latency['p99']:>8}", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--students", type=int, default=200, help="cohort size")
+    parser.add_argument("--pool-size", type=int, default=100, help="questions in the subject's pool")
+    parser.add_argument("--question-count", type=int, default=25, help="questions drawn per paper")
+    parser.add_argument("--arrival", choices=ARRIVAL_CURVES, default="burst")
+    parser.add_argument("--ramp-seconds", type=float, default=0.0, help="arrival window for ramp/poisson")
+    parser.add_argument("--think-seconds", type=float, default=0.0, help="mean pause between paper and submit")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connection pool size")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for arrivals and answers")
+    parser.add_argument("--mongo-url", default=None, help="local mongod to seed instead of the in-memory stand-in")
+    parser.add_argument("--report", default=None, help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    report = run_loadtest(options)
+    print_summary(report)
+    body = json.dumps(report, indent=2)
+    if options.report:
+        with open(options.report, "w") as f:
+            f.write(body + "\n")
+    else:
+        print(body)
+    return 0 if report["lifecycles"]["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
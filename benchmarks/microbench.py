@@ -0,0 +1,260 @@
+"""Micro-benchmarks for the CPU-side hot paths in server.py, isolated from the database
+
+Each benchmark builds synthetic fixtures of the configured size once, then
+times one call of the hot path (best of --repeat runs). Results are compared
+with a stored baseline and the run fails when any benchmark is slower than
+baseline by more than --threshold.
+
+    python benchmarks/microbench.py                      # compare with benchmarks/baseline.json
+    python benchmarks/microbench.py --save-baseline      # record a new baseline on this machine
+    python benchmarks/microbench.py --pool-size 500 --attempts 5000 --only grade_cohort
+
+Baselines are only comparable on the machine and fixture sizes they were
+recorded with; a size mismatch is reported instead of compared.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import server  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """Register a fixture builder: builder(sizes, rng) returns the zero-argument callable to time"""
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def run_sync(coro):
+    """Drive a coroutine that never suspends (e.g. load_paper on a warm pool) without an event loop"""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("coroutine suspended; the hot path is not isolated from I/O")
+
+
+def make_questions(count: int, rng: random.Random) -> list:
+    return [
+        {
+            "id": str(uuid.uuid4()), "question_text": f"Question {i}",
+            "options": [f"Option {letter}" for letter in "ABCD"], "correct_answer": rng.randrange(4),
+            "explanation": "", "units": rng.sample(server.UNITS, rng.randint(1, 2))
+        }
+        for i in range(count)
+    ]
+
+
+def make_answer_maps(answer_key: server.AnswerKey, attempts: int, question_count: int, rng: random.Random) -> list:
+    question_ids = answer_key.question_ids
+    return [
+        {qid: rng.randrange(4) for qid in rng.sample(question_ids, min(question_count, len(question_ids)))}
+        for _ in range(attempts)
+    ]
+
+
+@benchmark
+def answer_key_compile(sizes, rng):
+    questions = make_questions(sizes["pool_size"], rng)
+    return lambda: server.AnswerKey(questions)
+
+
+@benchmark
+def grade_submission(sizes, rng):
+    """submit_test: grade one paper, unit performance and the insight $inc document"""
+    answer_key = server.AnswerKey(make_questions(sizes["pool_size"], rng))
+    answers = make_answer_maps(answer_key, 1, sizes["question_count"], rng)
+
+    def run():
+        scores, totals, unit_correct, unit_total = answer_key.grade(answers)
+        unit_performance = server.unit_performance_from_row(unit_correct[0], unit_total[0])
+        return server.insight_increments(int(scores[0]), int(totals[0]), False, unit_performance)
+    return run
+
+
+@benchmark
+def grade_cohort(sizes, rng):
+    """Regrade and insight rebuild: grade every attempt of a test in one pass"""
+    answer_key = server.AnswerKey(make_questions(sizes["pool_size"], rng))
+    answer_maps = make_answer_maps(answer_key, sizes["attempts"], sizes["question_count"], rng)
+    return lambda: answer_key.grade(answer_maps)
+
+
+@benchmark
+def item_analysis(sizes, rng):
+    answer_key = server.AnswerKey(make_questions(sizes["pool_size"], rng))
+    answer_maps = make_answer_maps(answer_key, sizes["attempts"], sizes["question_count"], rng)
+    option_counts = {qid: 4 for qid in answer_key.question_ids}
+    return lambda: server.compute_item_analysis(answer_key, answer_maps, option_counts)
+
+
+@benchmark
+def insight_fold(sizes, rng):
+    """get_test_insights' aggregate: fold every attempt's $inc document into one summary"""
+    answer_key = server.AnswerKey(make_questions(sizes["pool_size"], rng))
+    scores, totals, unit_correct, unit_total = answer_key.grade(
+        make_answer_maps(answer_key, sizes["attempts"], sizes["question_count"], rng)
+    )
+
+    def run():
+        aggregate = {}
+        for row in range(len(scores)):
+            unit_performance = server.unit_performance_from_row(unit_correct[row], unit_total[row])
+            for field, value in server.insight_increments(int(scores[row]), int(totals[row]), False, unit_performance).items():
+                aggregate[field] = aggregate.get(field, 0) + value
+        return aggregate
+    return run
+
+
+@benchmark
+def paper_selection(sizes, rng):
+    """get_test_questions: seeded shuffle plus sanitized paper assembly from a warm pool"""
+    questions = make_questions(sizes["pool_size"], rng)
+    pool = server.QuestionPool(sorted(q["id"] for q in questions))
+    for question in questions:
+        pool.documents[question["id"]] = {k: v for k, v in question.items() if k not in ("correct_answer", "explanation")}
+    student_ids = [str(uuid.uuid4()) for _ in range(64)]
+    counter = iter(range(10 ** 12))
+
+    def run():
+        student_id = student_ids[next(counter) % len(student_ids)]
+        paper_ids = server.select_paper_ids("test-1", student_id, pool.question_ids, sizes["question_count"])
+        return run_sync(server.load_paper(pool, paper_ids))
+    return run
+
+
+@benchmark
+def paper_render(sizes, rng):
+    """Response encoding of one student's paper"""
+    questions = make_questions(sizes["question_count"], rng)
+    payload = {"test_id": "test-1", "questions": questions, "duration_minutes": 30}
+    return lambda: server.render_json(payload)
+
+
+@benchmark
+def token_encode(sizes, rng):
+    claims = {
+        "user_id": str(uuid.uuid4()), "user_type": "student", "name": "Student", "email": "s@example.com",
+        "profile": {"id": "s", "name": "Student", "department": "Computer Engineering", "year": 2}
+    }
+    return lambda: server.create_access_token(claims)
+
+
+@benchmark
+def token_decode(sizes, rng):
+    """First request with a token: signature verification and claim decoding"""
+    token = server.create_access_token({"user_id": str(uuid.uuid4()), "user_type": "student", "created": str(datetime.utcnow())})
+
+    def run():
+        server.token_cache.pop(token)
+        return server.decode_token(token)
+    return run
+
+
+@benchmark
+def token_decode_cached(sizes, rng):
+    """Later requests with the same token, served from token_cache"""
+    token = server.create_access_token({"user_id": str(uuid.uuid4()), "user_type": "student", "created": str(datetime.utcnow())})
+    server.decode_token(token)
+    return lambda: server.decode_token(token)
+
+
+def measure(name: str, sizes: dict, repeat: int, seed: int) -> float:
+    """Best-of-repeat seconds per call; the call count per run is calibrated to ~0.2s"""
+    func = BENCHMARKS[name](sizes, random.Random(seed))
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run_benchmarks(sizes: dict, names=None, repeat: int = 5, seed: int = 0) -> dict:
+    return {name: measure(name, sizes, repeat, seed) for name in (names or BENCHMARKS)}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> dict:
+    """Per benchmark: seconds, baseline seconds, ratio and whether it regressed past threshold"""
+    comparison = {}
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        ratio = seconds / base if base else None
+        comparison[name] = {
+            "seconds": seconds,
+            "baseline_seconds": base,
+            "ratio": ratio,
+            "regressed": ratio is not None and ratio > 1 + threshold,
+        }
+    return comparison
+
+
+def format_seconds(seconds) -> str:
+    if seconds is None:
+        return "-"
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--pool-size", type=int, default=200, help="questions in the test's pool")
+    parser.add_argument("--attempts", type=int, default=1000, help="attempts for cohort-wide benchmarks")
+    parser.add_argument("--question-count", type=int, default=25, help="questions per paper")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown over baseline (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="record these results as the new baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    sizes = {"pool_size": options.pool_size, "attempts": options.attempts, "question_count": options.question_count}
+    results = run_benchmarks(sizes, options.only, options.repeat, options.seed)
+
+    if options.save_baseline:
+        with open(options.baseline, "w") as f:
+            json.dump({"sizes": sizes, "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        for name, seconds in results.items():
+            print(f"{name:<20} {format_seconds(seconds):>12}")
+        print(f"Baseline written to {options.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as f:
+            stored = json.load(f)
+        if stored["sizes"] == sizes:
+            baseline = stored["results"]
+        else:
+            print(f"Baseline sizes {stored['sizes']} differ from {sizes}; not comparing", file=sys.stderr)
+
+    comparison = compare(results, baseline, options.threshold)
+    print(f"{'benchmark':<20} {'time':>12} {'baseline':>12} {'ratio':>7}")
+    for name, row in comparison.items():
+        ratio = f"{row['ratio']:.2f}" if row["ratio"] is not None else "-"
+        flag = "  REGRESSED" if row["regressed"] else ""
+        print(f"{name:<20} {format_seconds(row['seconds']):>12} {format_seconds(row['baseline_seconds']):>12} {ratio:>7}{flag}")
+
+    regressed = [name for name, row in comparison.items() if row["regressed"]]
+    if regressed:
+        print(f"Regressed past {options.threshold:.0%}: {', '.join(regressed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
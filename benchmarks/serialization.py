@@ -0,0 +1,75 @@
+"""Encode time and bytes on the wire for typical large API payloads
+
+Compares FastAPI's default path (jsonable_encoder + json.dumps) with the
+orjson renderer, and the raw body with gzip/brotli compression, for a
+25-question paper and a 1,000-row results list.
+
+    python benchmarks/serialization.py
+"""
+import json
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+import server  # noqa: E402
+
+
+def question_paper(count=25):
+    now = datetime.now(timezone.utc)
+    return {
+        "test": {"id": str(uuid.uuid4()), "title": "Engineering Physics - Unit Test", "duration_minutes": 30,
+                 "start_time": now, "end_time": now + timedelta(hours=1)},
+        "questions": [
+            {"id": str(uuid.uuid4()), "question_text": f"Question {i}: which statement about the system is correct?",
+             "options": [f"Option {c} for question {i}" for c in "ABCD"], "unit": f"Unit {i % 5 + 1}",
+             "created_at": now}
+            for i in range(count)
+        ],
+    }
+
+
+def results_list(count=1000):
+    now = datetime.now(timezone.utc)
+    return {
+        "results": [
+            {"id": str(uuid.uuid4()), "student_id": str(uuid.uuid4()), "student_name": f"Student {i}",
+             "roll_number": f"22CS{i:04d}", "score": i % 26, "total_questions": 25,
+             "percentage": round(i % 26 / 25 * 100, 2), "tab_switches": i % 3,
+             "submitted_at": now - timedelta(minutes=i),
+             "unit_performance": {f"Unit {u}": {"correct": u, "total": 5} for u in range(1, 6)}}
+            for i in range(count)
+        ]
+    }
+
+
+def default_render(payload):
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def measure(name, payload, number):
+    rows = [("default", default_render)]
+    if server.orjson is not None:
+        rows.append(("orjson", lambda p: server.FastJSONResponse(p).body))
+    print(f"\n{name}")
+    for label, render in rows:
+        seconds = min(timeit.repeat(lambda: render(payload), number=number, repeat=5)) / number
+        print(f"  encode {label:<8} {seconds * 1e6:10.1f} us")
+
+    body = default_render(payload)
+    print(f"  bytes  raw      {len(body):10d}")
+    for encoding in ("gzip", "br"):
+        if encoding == "br" and server.brotli is None:
+            continue
+        print(f"  bytes  {encoding:<8} {len(server.compress_body(body, encoding)):10d}")
+
+
+if __name__ == "__main__":
+    server.FAST_JSON_ENABLED = server.orjson is not None
+    measure("25-question paper", question_paper(), number=200)
+    measure("1,000-row results list", results_list(), number=10)
@@ -22,6 +22,25 @@ import {
 } from 'lucide-react';
 
 const API_URL = process.env.REACT_APP_BACKEND_URL;
+const PAGE_SIZE = 200;
+
+// List endpoints are paged; follow next_cursor until every page of `key` is loaded
+const fetchAllPages = async (path, key) => {
+  const token = localStorage.getItem('token');
+  const items = [];
+  let cursor = null;
+  do {
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`${API_URL}${path}?${params}`, {
+      headers: { 'Authorization': `Bearer ${token}` }
+    });
+    const data = await response.json();
+    items.push(...(data[key] || []));
+    cursor = data.next_cursor;
+  } while (cursor);
+  return items;
+};
 
 // Proctoring Hook (unchanged)
 const useProctoring = (isActive, onViolation) => {
@@ -557,12 +576,7 @@ const QuestionBank = () => {
 
   const fetchSubjects = async () => {
     try {
-      const token = localStorage.getItem('token');
-      const response = await fetch(`${API_URL}/api/subjects`, {
-        headers: { 'Authorization': `Bearer ${token}` }
-      });
-      const data = await response.json();
-      setSubjects(data.subjects || []);
+      setSubjects(await fetchAllPages('/api/subjects', 'subjects'));
     } catch (error) {
       console.error('Error fetching subjects:', error);
     }
@@ -785,12 +799,7 @@ const CreateTests = () => {
 
   const fetchSubjects = async () => {
     try {
-      const token = localStorage.getItem('token');
-      const response = await fetch(`${API_URL}/api/subjects`, {
-        headers: { 'Authorization': `Bearer ${token}` }
-      });
-      const data = await response.json();
-      setSubjects(data.subjects || []);
+      setSubjects(await fetchAllPages('/api/subjects', 'subjects'));
     } catch (error) {
       console.error('Error fetching subjects:', error);
     }
@@ -798,12 +807,7 @@ const CreateTests = () => {
 
   const fetchTests = async () => {
     try {
-      const token = localStorage.getItem('token');
-      const response = await fetch(`${API_URL}/api/staff/tests`, {
-        headers: { 'Authorization': `Bearer ${token}` }
-      });
-      const data = await response.json();
-      setTests(data.tests || []);
+      setTests(await fetchAllPages('/api/staff/tests', 'tests'));
     } catch (error) {
       console.error('Error fetching tests:', error);
     }
@@ -855,21 +859,68 @@ const CreateTests = () => {
     }
   };
 
-  const showLiveStatusModal = async (testId) => {
+  const showLiveStatusModal = (testId) => {
+    setLiveStudents([]);
     setSelectedTestId(testId);
     setShowLiveStatus(true);
+  };
+
+  // Live status is pushed over Server-Sent Events: a snapshot, then join/progress/submit deltas
+  useEffect(() => {
+    if (!showLiveStatus || !selectedTestId) return;
     
-    try {
-      const token = localStorage.getItem('token');
-      const response = await fetch(`${API_URL}/api/staff/live-status/${testId}`, {
-        headers: { 'Authorization': `Bearer ${token}` }
+    let source = null;
+    let closed = false;
+    
+    // The stream URL carries a short-lived token issued for this test, never the login token
+    const openStream = async () => {
+      try {
+        const response = await fetch(`${API_URL}/api/staff/live-status/${selectedTestId}/stream-token`, {
+          method: 'POST',
+          headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
+        });
+        if (!response.ok || closed) return;
+        const { token } = await response.json();
+        source = new EventSource(
+          `${API_URL}/api/staff/live-status/${selectedTestId}/stream?token=${encodeURIComponent(token)}`
+        );
+      } catch (error) {
+        console.error('Error opening live status stream:', error);
+        return;
+      }
+      
+      source.addEventListener('snapshot', (event) => {
+        setLiveStudents(JSON.parse(event.data).students || []);
       });
-      const data = await response.json();
-      setLiveStudents(data.live_students || []);
-    } catch (error) {
-      console.error('Error fetching live status:', error);
-    }
-  };
+      
+      source.addEventListener('delta', (event) => {
+        const delta = JSON.parse(event.data);
+        setLiveStudents(prev => {
+          const removed = new Set([...(delta.submitted || []), ...(delta.left || [])]);
+          const progress = Object.fromEntries((delta.progress || []).map(p => [p.student_id, p]));
+          return prev
+            .filter(student => !removed.has(student.student_id))
+            .map(student => progress[student.student_id] ? { ...student, ...progress[student.student_id] } : student)
+            .concat(delta.joined || []);
+        });
+      });
+      
+      source.onerror = (error) => {
+        console.error('Error streaming live status:', error);
+        // A reconnect with the original URL fails once its token expires; reopen with a fresh one
+        if (source.readyState === EventSource.CLOSED && !closed) {
+          setTimeout(openStream, 1000);
+        }
+      };
+    };
+    
+    openStream();
+    
+    return () => {
+      closed = true;
+      if (source) source.close();
+    };
+  }, [showLiveStatus, selectedTestId]);
 
   return (
     <div className="space-y-6">
@@ -1077,8 +1128,8 @@ const CreateTests = () => {
               <p className="text-center text-gray-500 py-4">No students currently taking this test</p>
             ) : (
               <div className="space-y-2">
-                {liveStudents.map((student, index) => (
-                  <div key={index} className="flex justify-between items-center p-3 bg-gray-50 rounded-lg">
+                {liveStudents.map((student) => (
+                  <div key={student.student_id} className="flex justify-between items-center p-3 bg-gray-50 rounded-lg">
                     <div>
                       <p className="font-medium">{student.student_name}</p>
                       <p className="text-sm text-gray-600">{student.register_number}</p>
@@ -1113,12 +1164,7 @@ const StaffInsights = () => {
 
   const fetchTests = async () => {
     try {
-      const token = localStorage.getItem('token');
-      const response = await fetch(`${API_URL}/api/staff/tests`, {
-        headers: { 'Authorization': `Bearer ${token}` }
-      });
-      const data = await response.json();
-      setTests(data.tests || []);
+      setTests(await fetchAllPages('/api/staff/tests', 'tests'));
     } catch (error) {
       console.error('Error fetching tests:', error);
     }
@@ -1286,6 +1332,54 @@ const TestInterface = () => {
     }
   }, [questions]);
 
+  // Keep the live session fresh for staff monitoring
+  useEffect(() => {
+    if (questions.length === 0) return;
+    sendHeartbeat();
+    const interval = setInterval(sendHeartbeat, 30000);
+    return () => clearInterval(interval);
+  }, [questions, currentQuestion, isTestSuspended]);
+
+  const sendHeartbeat = async () => {
+    try {
+      const token = localStorage.getItem('token');
+      await fetch(`${API_URL}/api/test/${testId}/heartbeat`, {
+        method: 'POST',
+        headers: {
+          'Authorization': `Bearer ${token}`,
+          'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+          current_question: currentQuestion,
+          status: isTestSuspended ? 'suspended' : 'active'
+        })
+      });
+    } catch (error) {
+      console.error('Error sending heartbeat:', error);
+    }
+  };
+
+  // Autosave answers a moment after they change; the server coalesces and writes them in bulk
+  useEffect(() => {
+    if (Object.keys(answers).length === 0) return;
+    const timeout = setTimeout(async () => {
+      try {
+        const token = localStorage.getItem('token');
+        await fetch(`${API_URL}/api/test/${testId}/autosave`, {
+          method: 'POST',
+          headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json'
+          },
+          body: JSON.stringify({ answers, tab_switches: tabSwitches })
+        });
+      } catch (error) {
+        console.error('Error autosaving answers:', error);
+      }
+    }, 2000);
+    return () => clearTimeout(timeout);
+  }, [answers]);
+
   const fetchTestQuestions = async () => {
     try {
       const token = localStorage.getItem('token');
@@ -1295,6 +1389,15 @@ const TestInterface = () => {
       const data = await response.json();
       setQuestions(data.questions || []);
       setTestDuration(data.duration_minutes || 45);
+      
+      // Restore answers autosaved before a reload or crash
+      const draftResponse = await fetch(`${API_URL}/api/test/${testId}/draft`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (draftResponse.ok) {
+        const draft = await draftResponse.json();
+        setAnswers(prev => ({ ...(draft.answers || {}), ...prev }));
+      }
     } catch (error) {
       console.error('Error fetching questions:', error);
     } finally {
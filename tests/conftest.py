@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import server  # noqa: E402
+
+
+class CountingCollection:
+    """Wraps a motor collection and counts every database command issued through it"""
+
+    COMMANDS = {
+        "find", "find_one", "aggregate", "insert_one", "insert_many", "update_one",
+        "update_many", "delete_one", "delete_many", "count_documents", "bulk_write",
+        "find_one_and_update",
+    }
+
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in self.COMMANDS:
+            def counted(*args, **kwargs):
+                self._counter[self._collection.name] = self._counter.get(self._collection.name, 0) + 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+class CountingDatabase:
+    def __init__(self, database):
+        self._database = database
+        self.commands = {}
+
+    def __getitem__(self, name):
+        return CountingCollection(self._database[name], self.commands)
+
+    def __getattr__(self, name):
+        return self[name]
+
+    @property
+    def total_commands(self):
+        return sum(self.commands.values())
+
+    def reset(self):
+        self.commands.clear()
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    database = CountingDatabase(AsyncMongoMockClient()["kongu_mcq_test"])
+    monkeypatch.setattr(server, "db", database)
+    server.question_pool_cache.clear()
+    server.answer_key_cache.clear()
+    server.item_analysis_cache.clear()
+    server.autosave_buffer.clear()
+    server.token_cache.clear()
+    server.profile_cache.clear()
+    server.response_memo.clear()
+    return database
+
+
+@pytest.fixture
+def run():
+    return lambda coro: asyncio.run(coro)
+
+
+@pytest.fixture
+def principal(run):
+    """Resolve a token payload the way the current_principal dependency does"""
+    return lambda user: run(server.current_principal(user))
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+STUDENT = {"user_id": "s1", "user_type": "student"}
+
+
+async def seed(db):
+    now = datetime.utcnow()
+    await db.tests.insert_one({
+        "id": "test-1", "subject_id": "subject-1", "is_active": True,
+        "start_date": now - timedelta(hours=1), "end_date": now + timedelta(hours=1),
+    })
+    for i in range(3):
+        await db.questions.insert_one({
+            "id": f"q{i}", "correct_answer": 1, "units": ["Unit 1"], "options": ["A", "B", "C", "D"], "subject_id": "subject-1"
+        })
+
+
+def start_session(run, student_id, test_id="test-1"):
+    run(server.live_session_store.start(test_id, student_id, f"Student {student_id}", f"REG-{student_id}"))
+
+
+def test_autosaves_are_coalesced_into_one_bulk_write(mock_db, run):
+    run(seed(mock_db))
+    start_session(run, "s1")
+    start_session(run, "s2")
+    mock_db.reset()
+    for click in range(50):
+        run(server.autosave_answers("test-1", server.AnswerAutosave(answers={f"q{click % 3}": click % 4}), current_user=STUDENT))
+    run(server.autosave_answers("test-1", server.AnswerAutosave(answers={}), current_user={"user_id": "s2", "user_type": "student"}))
+    # Each save checks the live session and the cached answer key; nothing is written until the flush
+    assert mock_db.commands == {"live_sessions": 51, "tests": 1, "questions": 1}
+
+    mock_db.reset()
+    assert run(server.autosave_buffer.flush()) == 2
+    assert mock_db.commands == {"test_attempts": 1, "draft_attempts": 1}
+    draft = run(mock_db.draft_attempts.find_one({"student_id": "s1"}))
+    assert draft["answers"] == {"q0": 0, "q1": 1, "q2": 3}
+
+
+def test_submit_finalizes_from_draft(mock_db, run, principal):
+    run(seed(mock_db))
+    start_session(run, "s1")
+    run(server.autosave_answers("test-1", server.AnswerAutosave(answers={"q0": 1, "q1": 0}, tab_switches=2), current_user=STUDENT))
+    run(server.autosave_buffer.flush())
+    run(server.autosave_answers("test-1", server.AnswerAutosave(answers={"q2": 1}), current_user=STUDENT))
+    assert run(server.get_draft_answers("test-1", current_user=STUDENT))["answers"] == {"q0": 1, "q1": 0, "q2": 1}
+
+    # The browser crashed and lost its state; the submission only carries a corrected answer
+    attempt = server.TestAttempt(test_id="test-1", student_id="s1", answers={"q1": 1}, tab_switches=0, is_malpractice=False)
+    response = run(server.submit_test(attempt, current_user=principal(STUDENT)))
+
+    assert response["score"] == 3
+    saved = run(mock_db.test_attempts.find_one({"student_id": "s1"}))
+    assert saved["tab_switches"] == 2
+    assert run(mock_db.draft_attempts.count_documents({})) == 0
+    assert server.autosave_buffer.pending("test-1", "s1") is None
+
+
+def test_autosave_requires_an_active_session(mock_db, run):
+    save = server.AnswerAutosave(answers={"q0": 1})
+    with pytest.raises(server.HTTPException) as error:
+        run(server.autosave_answers("made-up-test", save, current_user=STUDENT))
+    assert error.value.status_code == 409
+
+    start_session(run, "s1")
+    run(server.live_session_store.end("test-1", "s1"))
+    with pytest.raises(server.HTTPException):
+        run(server.autosave_answers("test-1", save, current_user=STUDENT))
+    assert server.autosave_buffer.pending("test-1", "s1") is None
+
+
+def test_flush_does_not_resurrect_drafts_submitted_on_another_worker(mock_db, run):
+    run(seed(mock_db))
+    start_session(run, "s1")
+    start_session(run, "s2")
+    run(server.autosave_answers("test-1", server.AnswerAutosave(answers={"q0": 1}), current_user=STUDENT))
+    run(server.autosave_answers("test-1", server.AnswerAutosave(answers={"q0": 2}), current_user={"user_id": "s2", "user_type": "student"}))
+    # s1 submitted through a different worker, which never saw this buffer
+    run(mock_db.test_attempts.insert_one({"id": "a1", "test_id": "test-1", "student_id": "s1"}))
+
+    assert run(server.autosave_buffer.flush()) == 1
+    assert [d["student_id"] for d in run(mock_db.draft_attempts.find().to_list(None))] == ["s2"]
+
+
+def test_drafts_expire_after_their_last_save():
+    assert ("draft_attempts", [("updated_at", server.ASCENDING)], {"expireAfterSeconds": server.DRAFT_TTL_SECONDS}) in server.INDEX_SPECS
+
+
+def test_out_of_range_options_are_rejected(mock_db, run):
+    run(seed(mock_db))
+    start_session(run, "s1")
+    with pytest.raises(server.HTTPException) as error:
+        run(server.autosave_answers("test-1", server.AnswerAutosave(answers={"q0": 40000}), current_user=STUDENT))
+    assert error.value.status_code == 422
+    assert server.autosave_buffer.pending("test-1", "s1") is None
+    with pytest.raises(ValueError):
+        server.AnswerAutosave(answers={"q0": -1})
+
+
+def test_autosave_rejects_questions_outside_the_test(mock_db, run):
+    run(seed(mock_db))
+    start_session(run, "s1")
+    for answers in [{"q9": 1}, {"answers.$where": 1}, {"": 0}]:
+        with pytest.raises(server.HTTPException) as error:
+            run(server.autosave_answers("test-1", server.AnswerAutosave(answers=answers), current_user=STUDENT))
+        assert error.value.status_code == 422
+    assert server.autosave_buffer.pending("test-1", "s1") is None
+
+
+class FailingDrafts:
+    """draft_attempts whose first bulk write fails with the given per-operation error codes"""
+
+    def __init__(self, codes):
+        self.codes = codes
+        self.batches = []
+
+    async def bulk_write(self, operations, ordered):
+        self.batches.append(len(operations))
+        if len(self.batches) == 1:
+            write_errors = [{"index": index, "code": code, "errmsg": "failed"} for index, code in self.codes.items()]
+            raise server.BulkWriteError({"writeErrors": write_errors})
+
+
+def test_flush_retries_only_transient_write_errors(run, monkeypatch):
+    async def nothing_submitted(keys):
+        return set()
+    drafts = FailingDrafts({0: 52, 1: 112})  # a rejected field name, then a write conflict
+    monkeypatch.setattr(server, "submitted_attempt_keys", nothing_submitted)
+    monkeypatch.setattr(server, "db", type("Db", (), {"draft_attempts": drafts})())
+    buffer = server.AnswerAutosaveBuffer(flush_seconds=60, max_pending=10000)
+    for i in range(1500):
+        buffer.record("test-1", f"s{i}", {"q0": 1})
+
+    assert run(buffer.flush()) == 1498
+    assert drafts.batches == [1000, 500]  # the later chunk still ran
+    assert buffer.pending("test-1", "s0") is None
+    assert buffer.pending("test-1", "s1") == {"answers": {"q0": 1}, "tab_switches": None}
+    assert len(buffer._pending) == 1
+
+
+def test_failed_submission_keeps_the_autosaved_draft(mock_db, run, principal, monkeypatch):
+    run(seed(mock_db))
+    start_session(run, "s1")
+    run(server.autosave_answers("test-1", server.AnswerAutosave(answers={"q0": 1}), current_user=STUDENT))
+    run(server.autosave_buffer.flush())
+    run(server.autosave_answers("test-1", server.AnswerAutosave(answers={"q1": 1}), current_user=STUDENT))
+
+    def grading_fails(*args):
+        raise RuntimeError("grading failed")
+    monkeypatch.setattr(server, "unit_performance_from_row", grading_fails)
+    attempt = server.TestAttempt(test_id="test-1", student_id="s1", answers={"q2": 1}, tab_switches=0, is_malpractice=False)
+    with pytest.raises(RuntimeError):
+        run(server.submit_test(attempt, current_user=principal(STUDENT)))
+
+    assert run(server.get_draft_answers("test-1", current_user=STUDENT))["answers"] == {"q0": 1, "q1": 1}
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import server
+
+STAFF = {"user_id": "staff-1", "user_type": "staff"}
+STUDENT = {"user_id": "student-0", "user_type": "student"}
+
+
+async def seed(db, subject_count, attempt_count):
+    now = datetime.utcnow()
+    await db.staff.insert_one({"id": "staff-1", "department": "Computer Engineering"})
+    for i in range(attempt_count):
+        await db.students.insert_one({
+            "id": f"student-{i}",
+            "name": f"Student {i}",
+            "register_number": f"REG{i:04d}",
+            "email": f"student{i}@example.com",
+            "department": "Computer Engineering",
+            "year": 2,
+        })
+        await db.test_attempts.insert_one({
+            "id": f"attempt-{i}",
+            "test_id": "test-0",
+            "student_id": f"student-{i}",
+            "score": i % 25,
+            "total_questions": 25,
+            "is_malpractice": False,
+            "tab_switches": 0,
+            "submitted_at": now,
+        })
+    for i in range(subject_count):
+        await db.subjects.insert_one({"id": f"subject-{i}", "name": f"Subject {i}", "course_code": f"C{i}"})
+        await db.tests.insert_one({
+            "id": f"test-{i}",
+            "subject_id": f"subject-{i}",
+            "category": "CAT",
+            "start_date": now - timedelta(hours=1),
+            "end_date": now + timedelta(hours=1),
+            "duration_minutes": 30,
+            "target_year": 2,
+            "target_semester": 3,
+            "department": "Computer Engineering",
+            "created_by": "staff-1",
+            "is_active": True,
+        })
+    db.reset()
+
+
+def test_staff_test_results_cost_is_independent_of_attempt_count(mock_db, run):
+    run(seed(mock_db, subject_count=1, attempt_count=60))
+    response = run(server.get_staff_test_results("test-0", limit=100, current_user=STAFF))
+    assert len(response["results"]) == 60
+    assert response["results"][0]["register_number"] == "REG0000"
+    assert mock_db.total_commands == 2
+
+
+def test_staff_tests_cost_is_independent_of_test_count(mock_db, run):
+    run(seed(mock_db, subject_count=40, attempt_count=1))
+    response = run(server.get_staff_tests(current_user=STAFF))
+    assert len(response["tests"]) == 40
+    assert all("subject_name" in test for test in response["tests"])
+    assert mock_db.total_commands == 2
+
+
+def test_available_tests_cost_is_independent_of_test_count(mock_db, run, principal):
+    run(seed(mock_db, subject_count=40, attempt_count=1))
+    student = principal(STUDENT)
+    mock_db.reset()
+    response = run(server.get_available_tests(current_user=student))
+    assert len(response["tests"]) == 40
+    assert mock_db.commands == {"tests": 1, "subjects": 1}
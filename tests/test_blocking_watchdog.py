@@ -0,0 +1,51 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import server
+
+
+def block_for(seconds):
+    time.sleep(seconds)
+
+
+def test_stall_is_attributed_to_the_blocking_route(capsys):
+    server.metrics.clear()
+    watchdog = server.BlockingWatchdog(threshold=0.05, stack_depth=10)
+
+    async def blocking_app(scope, receive, send):
+        scope["route"] = SimpleNamespace(path="/api/slow/{item_id}")
+        block_for(0.3)
+
+    async def scenario():
+        watchdog.start()
+        await asyncio.sleep(0.05)
+        middleware = server.BlockingWatchdogMiddleware(blocking_app, watchdog)
+        await middleware({"type": "http", "method": "GET", "path": "/api/slow/1"}, None, None)
+        await asyncio.sleep(0.1)
+        await watchdog.stop()
+
+    asyncio.run(scenario())
+
+    assert len(watchdog.recent) == 1
+    stall = watchdog.recent[0]
+    assert (stall["route"], stall["method"], stall["path"]) == ("/api/slow/{item_id}", "GET", "/api/slow/1")
+    assert "block_for" in stall["stack"]
+    assert 0.15 < stall["duration_seconds"] < 1
+    assert watchdog.active_requests == {}
+    assert server.event_loop_blocks.value("/api/slow/{item_id}") == 1
+    assert "Event loop blocked" in capsys.readouterr().out
+
+
+def test_short_pauses_are_not_reported():
+    watchdog = server.BlockingWatchdog(threshold=0.2, stack_depth=10)
+
+    async def scenario():
+        watchdog.start()
+        for _ in range(5):
+            block_for(0.02)
+            await asyncio.sleep(0.02)
+        await watchdog.stop()
+
+    asyncio.run(scenario())
+    assert list(watchdog.recent) == []
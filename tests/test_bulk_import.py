@@ -0,0 +1,146 @@
+from io import BytesIO
+
+from fastapi import UploadFile
+from openpyxl import Workbook
+import pytest
+
+import server
+
+STAFF = {"user_id": "staff-1", "user_type": "staff"}
+
+QUESTION_CSV = """question_text,option_a,option_b,option_c,option_d,correct_answer,explanation,units
+What is 2+2?,3,4,5,6,1,Basic sum,Unit 1
+Capital of France?,Paris,Rome,,,A,,Unit 2; Unit 3
+,x,y,,,0,,Unit 1
+Gap?,a,,c,,0,,Unit 1
+Out of range?,a,b,,,3,,Unit 1
+Bad unit?,a,b,,,B,,Unit 9
+"""
+
+
+ROSTER_CSV = """name,register_number,roll_number,department,year,semester,email,password
+Asha,REG001,1,Computer Engineering,2,3,asha@example.com,pw1
+Bala,REG002,2,Computer Engineering,2,3,bala@example.com,pw2
+Chitra,REG001,3,Computer Engineering,2,3,chitra@example.com,pw3
+Deepak,REG004,4,Computer Engineering,2,3,bala@example.com,pw4
+Esha,REG005,5,Unknown,two,3,not-an-email,pw5
+Farid,REG006,6,Civil Engineering,1,1,farid@example.com,pw6
+"""
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    password_hasher = server.PasswordHasher(rounds=1000, workers=0, concurrency=2)
+    monkeypatch.setattr(server, "password_hasher", password_hasher)
+    monkeypatch.setattr(server, "ROSTER_PASSWORD_HASH_ROUNDS", 500)
+    return password_hasher
+
+
+def upload(content: bytes, filename: str) -> UploadFile:
+    return UploadFile(file=BytesIO(content), filename=filename)
+
+
+def test_question_import_validates_rows_and_inserts_in_chunks(mock_db, run, monkeypatch):
+    run(mock_db.subjects.insert_one({"id": "subject-1", "name": "Maths"}))
+    monkeypatch.setattr(server, "IMPORT_CHUNK_ROWS", 2)
+    mock_db.reset()
+
+    result = run(server.import_questions("subject-1", upload(QUESTION_CSV.encode(), "bank.csv"), current_user=STAFF))
+
+    assert result["inserted"] == 2
+    assert result["invalid"] == 4
+    assert [(e["row"], e["errors"]) for e in result["errors"]] == [
+        (4, ["question_text is required"]),
+        (5, ["options must be filled without gaps"]),
+        (6, ["correct_answer must select a filled option"]),
+        (7, ["units must be one or more of: " + ", ".join(server.UNITS)]),
+    ]
+    # Three chunks of two rows: one subject lookup, and an insert only for chunks with valid rows
+    assert mock_db.commands == {"subjects": 1, "questions": 1}
+
+    questions = run(mock_db.questions.find({}, {"_id": 0}).to_list(None))
+    france = next(q for q in questions if q["question_text"] == "Capital of France?")
+    assert france["options"] == ["Paris", "Rome"]
+    assert france["correct_answer"] == 0
+    assert france["units"] == ["Unit 2", "Unit 3"]
+    assert all(q["subject_id"] == "subject-1" and q["created_by"] == "staff-1" for q in questions)
+
+
+def test_question_import_reports_rows_the_database_rejected(mock_db, run, monkeypatch):
+    run(mock_db.subjects.insert_one({"id": "subject-1", "name": "Maths"}))
+    run(mock_db.questions.create_index("question_text", unique=True))
+    run(mock_db.questions.insert_one({"id": "existing", "question_text": "Capital of France?"}))
+    monkeypatch.setattr(server, "IMPORT_CHUNK_ROWS", 3)
+
+    result = run(server.import_questions("subject-1", upload(QUESTION_CSV.encode(), "bank.csv"), current_user=STAFF))
+
+    assert result["inserted"] == 1
+    assert result["invalid"] == 5
+    assert [e["row"] for e in result["errors"]] == [4, 3, 5, 6, 7]
+    assert result["errors"][1]["errors"][0]
+
+
+def test_question_import_reads_xlsx(mock_db, run):
+    run(mock_db.subjects.insert_one({"id": "subject-1", "name": "Maths"}))
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Question Text", "Option A", "Option B", "Correct Answer", "Units"])
+    for i in range(5):
+        sheet.append([f"Question {i}", "yes", "no", i % 2, "Unit 4"])
+    data = BytesIO()
+    workbook.save(data)
+
+    result = run(server.import_questions("subject-1", upload(data.getvalue(), "bank.xlsx"), current_user=STAFF))
+    assert (result["inserted"], result["invalid"]) == (5, 0)
+    answers = sorted(q["correct_answer"] for q in run(mock_db.questions.find().to_list(None)))
+    assert answers == [0, 0, 0, 1, 1]
+
+
+def test_roster_import_reports_duplicates_from_unique_indexes(mock_db, run, hasher, monkeypatch):
+    run(server.ensure_indexes())
+    run(mock_db.students.insert_one({"id": "existing", "register_number": "REG006", "email": "old@example.com"}))
+    monkeypatch.setattr(server, "IMPORT_CHUNK_ROWS", 3)
+    mock_db.reset()
+
+    result = run(server.import_students(upload(ROSTER_CSV.encode(), "roster.csv"), current_user=STAFF))
+
+    assert (result["inserted"], result["duplicates"], result["invalid"]) == (2, 3, 1)
+    assert sorted((e["row"], e["errors"][0]) for e in result["errors"]) == [
+        (4, "register_number already registered"),
+        (5, "email already registered"),
+        (6, "Invalid department"),
+        (7, "register_number already registered"),
+    ]
+    # No existence pre-queries: one insert_many per chunk
+    assert mock_db.commands == {"students": 2}
+
+    asha = run(mock_db.students.find_one({"register_number": "REG001"}))
+    assert (asha["year"], asha["semester"]) == (2, 3)
+    assert server.verify_password_sync("pw1", asha["password"], server.PASSWORD_HASH_ROUNDS)[0]
+
+
+def test_xlsx_numbers_next_to_blank_cells_keep_their_text(mock_db, run, hasher):
+    run(server.ensure_indexes())
+    run(mock_db.subjects.insert_one({"id": "subject-1", "name": "Maths"}))
+    questions = Workbook()
+    sheet = questions.active
+    sheet.append(["question_text", "option_a", "option_b", "option_c", "correct_answer", "units"])
+    sheet.append(["1+2?", 3, 4, 5, 0, "Unit 1"])
+    sheet.append(["1+1?", 2, 3, None, 0, "Unit 1"])
+    data = BytesIO()
+    questions.save(data)
+    run(server.import_questions("subject-1", upload(data.getvalue(), "bank.xlsx"), current_user=STAFF))
+    options = {q["question_text"]: q["options"] for q in run(mock_db.questions.find().to_list(None))}
+    assert options == {"1+2?": ["3", "4", "5"], "1+1?": ["2", "3"]}
+
+    roster = Workbook()
+    sheet = roster.active
+    sheet.append(server.ROSTER_COLUMNS)
+    sheet.append(["Asha", 712345, 1, "Computer Engineering", 2, 3, "asha@example.com", "pw1"])
+    sheet.append(["Bala", None, 2, "Computer Engineering", 2, 3, "bala@example.com", "pw2"])
+    data = BytesIO()
+    roster.save(data)
+    result = run(server.import_students(upload(data.getvalue(), "roster.xlsx"), current_user=STAFF))
+    assert (result["inserted"], result["invalid"]) == (1, 1)
+    asha = run(mock_db.students.find_one({"name": "Asha"}))
+    assert (asha["register_number"], asha["roll_number"]) == ("712345", "1")
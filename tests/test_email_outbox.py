@@ -0,0 +1,65 @@
+import socket
+
+from aiosmtpd.controller import Controller
+
+import server
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, smtp, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_dispatcher(port, **kwargs):
+    return server.EmailDispatcher(
+        "127.0.0.1", port, False, "", "", "exams@example.com",
+        concurrency=1, retry_base_seconds=0, **kwargs
+    )
+
+
+def test_outbox_is_drained_over_one_reused_connection(mock_db, run, monkeypatch):
+    monkeypatch.setattr(server, "EMAIL_FROM", "exams@example.com")
+    handler = RecordingHandler()
+    port = free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    dispatcher = make_dispatcher(port)
+    try:
+        for i in range(5):
+            assert run(server.enqueue_email(f"student{i}@example.com", "Test Completed", "<p>done</p>"))
+        assert run(dispatcher.drain_once()) == 5
+    finally:
+        dispatcher.close_connections()
+        controller.stop()
+
+    assert sorted(envelope.rcpt_tos[0] for envelope in handler.messages) == [
+        f"student{i}@example.com" for i in range(5)
+    ]
+    assert len(handler.sessions) == 1
+    assert run(mock_db.email_outbox.count_documents({"status": "sent"})) == 5
+
+
+def test_failed_delivery_is_retried_then_marked_failed(mock_db, run, monkeypatch):
+    monkeypatch.setattr(server, "EMAIL_FROM", "exams@example.com")
+    dispatcher = make_dispatcher(1, max_attempts=2)  # nothing listens on port 1
+    run(server.enqueue_email("student@example.com", "Test Completed", "<p>done</p>"))
+
+    assert run(dispatcher.drain_once()) == 1
+    message = run(mock_db.email_outbox.find_one({}))
+    assert message["status"] == "pending" and message["attempts"] == 1
+
+    assert run(dispatcher.drain_once()) == 1
+    message = run(mock_db.email_outbox.find_one({}))
+    assert message["status"] == "failed" and message["attempts"] == 2
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+STAFF = {"user_id": "staff-1", "user_type": "staff"}
+
+QUESTIONS = [
+    {"id": "q1", "correct_answer": 0, "units": ["Unit 1"]},
+    {"id": "q2", "correct_answer": 1, "units": ["Unit 1", "Unit 2"]},
+    {"id": "q3", "correct_answer": 2, "units": ["Unit 3"]},
+]
+
+
+async def seed(db):
+    now = datetime.utcnow()
+    await db.tests.insert_one({
+        "id": "test-1",
+        "subject_id": "subject-1",
+        "start_date": now - timedelta(hours=1),
+        "end_date": now + timedelta(hours=1),
+        "is_active": True,
+    })
+    for question in QUESTIONS:
+        await db.questions.insert_one(dict(question, subject_id="subject-1"))
+
+
+def test_answer_key_grades_score_and_unit_performance():
+    key = server.AnswerKey(QUESTIONS)
+    scores, totals, unit_correct, unit_total = key.grade([
+        {"q1": 0, "q2": 1, "q3": 0},
+        {"q2": 3, "unknown": 1},
+    ])
+    assert scores.tolist() == [2, 0]
+    assert totals.tolist() == [3, 1]
+    assert server.unit_performance_from_row(unit_correct[0], unit_total[0]) == {
+        "Unit 1": {"correct": 2, "total": 2},
+        "Unit 2": {"correct": 1, "total": 1},
+        "Unit 3": {"correct": 0, "total": 1},
+    }
+    assert server.unit_performance_from_row(unit_correct[1], unit_total[1]) == {
+        "Unit 1": {"correct": 0, "total": 1},
+        "Unit 2": {"correct": 0, "total": 1},
+    }
+
+
+def test_submit_then_regrade_after_key_correction(mock_db, run, principal):
+    run(seed(mock_db))
+    for i, answers in enumerate([{"q1": 0, "q2": 1, "q3": 1}, {"q1": 1, "q2": 1, "q3": 1}]):
+        attempt = server.TestAttempt(
+            test_id="test-1", student_id=f"s{i}", answers=answers, tab_switches=0, is_malpractice=False
+        )
+        run(server.submit_test(attempt, current_user=principal({"user_id": f"s{i}", "user_type": "student"})))
+    assert sorted(a["score"] for a in run(mock_db.test_attempts.find({}).to_list(None))) == [1, 2]
+
+    run(mock_db.questions.update_one({"id": "q3"}, {"$set": {"correct_answer": 1}}))
+    with pytest.raises(server.HTTPException) as error:
+        run(server.regrade_test("test-1", current_user=STAFF))
+    assert error.value.status_code == 409
+
+    run(mock_db.tests.update_one({"id": "test-1"}, {"$set": {"end_date": datetime.utcnow() - timedelta(minutes=1)}}))
+    mock_db.reset()
+    response = run(server.regrade_test("test-1", current_user=STAFF))
+
+    assert response["regraded"] == 2
+    assert mock_db.commands["test_attempts"] == 3  # one read, one bulk write, one insights rebuild read
+    attempts = {a["student_id"]: a for a in run(mock_db.test_attempts.find({}).to_list(None))}
+    assert attempts["s0"]["score"] == 3
+    assert attempts["s1"]["score"] == 2
+    assert attempts["s1"]["unit_performance"]["Unit 3"] == {"correct": 1, "total": 1}
+
+
+def test_out_of_range_selections_grade_as_wrong_answers():
+    key = server.AnswerKey([dict(q, options=["A", "B", "C"]) for q in QUESTIONS])
+    assert key.invalid_answers({"q1": 3, "q2": 40000, "q3": 2, "unknown": 9}) == ["q1", "q2"]
+
+    # Attempts stored before submissions were validated must still grade
+    scores, totals, _, _ = key.grade([{"q1": 40000, "q2": 1, "q3": 7}])
+    assert scores.tolist() == [1]
+    assert totals.tolist() == [3]
+    items = server.compute_item_analysis(key, [{"q1": 40000, "q2": 1}], {"q1": 3, "q2": 3, "q3": 3})
+    assert items[0]["option_frequencies"] == [0, 0, 0]
+    assert items[0]["difficulty"] == 0
+
+
+def test_submit_rejects_out_of_range_options(mock_db, run, principal):
+    run(seed(mock_db))
+    run(mock_db.questions.update_many({}, {"$set": {"options": ["A", "B", "C", "D"]}}))
+    attempt = server.TestAttempt(test_id="test-1", student_id="s0", answers={"q1": 40000}, tab_switches=0, is_malpractice=False)
+    with pytest.raises(server.HTTPException) as error:
+        run(server.submit_test(attempt, current_user=principal({"user_id": "s0", "user_type": "student"})))
+    assert error.value.status_code == 422
+    assert run(mock_db.test_attempts.count_documents({})) == 0
@@ -0,0 +1,33 @@
+import json
+
+import server
+
+STAFF = {"user_id": "staff-1", "user_type": "staff", "profile": {"id": "staff-1", "department": "Basic Science"}}
+
+
+def test_reference_data_revalidates_with_304(run):
+    first = run(server.get_departments(if_none_match=None))
+    assert first.status_code == 200
+    assert json.loads(first.body)["departments"] == server.DEPARTMENTS
+    assert "max-age" in first.headers["cache-control"]
+
+    repeat = run(server.get_departments(if_none_match=first.headers["etag"]))
+    assert repeat.status_code == 304
+    assert repeat.body == b""
+
+
+def test_subjects_etag_changes_when_a_subject_is_created(mock_db, run):
+    first = run(server.get_subjects(current_user=STAFF, if_none_match=None))
+    assert json.loads(first.body)["subjects"] == []
+
+    mock_db.reset()
+    repeat = run(server.get_subjects(current_user=STAFF, if_none_match=first.headers["etag"]))
+    assert repeat.status_code == 304
+    assert mock_db.commands == {"collection_versions": 1}
+
+    subject = server.SubjectCreate(name="Physics", course_code="PHY1", department="Basic Science")
+    run(server.create_subject(subject, current_user=STAFF))
+    changed = run(server.get_subjects(current_user=STAFF, if_none_match=first.headers["etag"]))
+    assert changed.status_code == 200
+    assert [s["name"] for s in json.loads(changed.body)["subjects"]] == ["Physics"]
+    assert changed.headers["etag"] != first.headers["etag"]
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+STAFF = {"user_id": "staff-1", "user_type": "staff"}
+
+
+async def seed(db):
+    now = datetime.utcnow()
+    await db.tests.insert_one({
+        "id": "test-1",
+        "subject_id": "subject-1",
+        "start_date": now - timedelta(hours=1),
+        "end_date": now + timedelta(hours=1),
+        "is_active": True,
+    })
+    for i, units in enumerate([["Unit 1"], ["Unit 1", "Unit 2"], ["Unit 2"], ["Unit 3"]]):
+        await db.questions.insert_one({"id": f"q{i}", "correct_answer": 0, "units": units, "subject_id": "subject-1"})
+
+
+def end_test(run, db):
+    run(db.tests.update_one({"id": "test-1"}, {"$set": {"end_date": datetime.utcnow() - timedelta(minutes=1)}}))
+
+
+def submit(run, student_id, answers, is_malpractice=False):
+    attempt = server.TestAttempt(
+        test_id="test-1", student_id=student_id, answers=answers, tab_switches=0, is_malpractice=is_malpractice
+    )
+    run(server.submit_test(attempt, current_user=run(server.current_principal({"user_id": student_id, "user_type": "student"}))))
+
+
+def test_insights_are_a_single_read_and_match_rebuild(mock_db, run):
+    run(seed(mock_db))
+    submit(run, "s1", {"q0": 0, "q1": 0, "q2": 0, "q3": 0})
+    submit(run, "s2", {"q0": 1, "q1": 0, "q2": 1, "q3": 1}, is_malpractice=True)
+    submit(run, "s3", {"q0": 0, "q1": 1})
+
+    mock_db.reset()
+    incremental = run(server.get_test_insights("test-1", current_user=STAFF))
+    assert mock_db.total_commands == 1
+    assert incremental["total_attempts"] == 3
+    assert incremental["average_score"] == 2.0
+    assert incremental["score_std_dev"] == 1.41
+    assert incremental["malpractice_count"] == 1
+    assert incremental["unit_insights"]["Unit 1"] == {
+        "average_percentage": 66.67, "total_questions": 6, "total_attempts": 3
+    }
+
+    with pytest.raises(server.HTTPException) as error:
+        run(server.rebuild_insights("test-1", current_user=STAFF))
+    assert error.value.status_code == 409
+
+    end_test(run, mock_db)
+    run(mock_db.test_insights.delete_many({}))
+    run(server.rebuild_insights("test-1", current_user=STAFF))
+    assert run(server.get_test_insights("test-1", current_user=STAFF)) == incremental
+
+
+def test_missing_aggregate_is_rebuilt_from_existing_attempts(mock_db, run):
+    run(seed(mock_db))
+    submit(run, "s1", {"q0": 0, "q1": 0, "q2": 0, "q3": 0})
+    submit(run, "s2", {"q0": 1, "q1": 0})
+    incremental = run(server.get_test_insights("test-1", current_user=STAFF))
+
+    # Attempts that predate the aggregate have no test_insights document
+    run(mock_db.test_insights.delete_many({}))
+    assert run(server.get_test_insights("test-1", current_user=STAFF)) == incremental
+    assert run(mock_db.test_insights.count_documents({})) == 1
+    assert run(server.get_test_insights("other-test", current_user=STAFF)) == {"message": "No attempts found for this test"}
+
+
+def test_item_analysis_statistics_and_cache(mock_db, run):
+    run(seed(mock_db))
+    submit(run, "s1", {"q0": 0, "q1": 0, "q2": 0, "q3": 0})
+    submit(run, "s2", {"q0": 1, "q1": 0, "q2": 1, "q3": 1})
+    submit(run, "s3", {"q0": 0, "q1": 1})
+
+    analysis = run(server.get_test_item_analysis("test-1", current_user=STAFF))
+    items = {item["question_id"]: item for item in analysis["items"]}
+    assert analysis["total_attempts"] == 3
+    assert items["q0"]["difficulty"] == 0.6667
+    assert items["q0"]["option_frequencies"][:2] == [0.6667, 0.3333]
+    assert items["q3"]["answered"] == 2
+    assert items["q0"]["discrimination"] > 0
+    assert items["q1"]["discrimination"] > 0
+
+    mock_db.reset()
+    assert run(server.get_test_item_analysis("test-1", current_user=STAFF)) == analysis
+    assert "test_attempts" not in mock_db.commands
+
+    submit(run, "s4", {"q3": 0})
+    assert run(server.get_test_item_analysis("test-1", current_user=STAFF))["total_attempts"] == 4
@@ -0,0 +1,124 @@
+import pytest
+
+import server
+
+STAFF = {"user_id": "staff-1", "user_type": "staff"}
+STUDENT = {"user_id": "student-1", "user_type": "student"}
+
+
+@pytest.fixture(params=["memory", "mongo"])
+def store(request, mock_db, monkeypatch):
+    live_store = server.LIVE_SESSION_STORES[request.param](ttl_seconds=60)
+    monkeypatch.setattr(server, "live_session_store", live_store)
+    return live_store
+
+
+def test_heartbeat_updates_progress_visible_to_staff(store, run):
+    run(store.start("test-1", "student-1", "Student 1", "REG0001"))
+    run(server.test_heartbeat("test-1", server.Heartbeat(current_question=7), current_user=STUDENT))
+
+    live = run(server.get_live_test_status("test-1", current_user=STAFF))["live_students"]
+    assert len(live) == 1
+    assert live[0]["student_name"] == "Student 1"
+    assert live[0]["current_question"] == 7
+
+    # Reloading the paper keeps progress and the original start time
+    start_time = live[0]["start_time"]
+    run(store.start("test-1", "student-1", "Student 1", "REG0001"))
+    live = run(server.get_live_test_status("test-1", current_user=STAFF))["live_students"]
+    assert live[0]["current_question"] == 7 and live[0]["start_time"] == start_time
+
+    run(store.end("test-1", "student-1"))
+    assert run(server.get_live_test_status("test-1", current_user=STAFF))["live_students"] == []
+
+
+def test_heartbeat_cannot_mark_a_session_submitted(store, run):
+    with pytest.raises(ValueError):
+        server.Heartbeat(current_question=3, status="submitted")
+
+    run(store.start("test-1", "student-1", "Student 1", "REG0001"))
+    run(server.test_heartbeat("test-1", server.Heartbeat(current_question=3, status="suspended"), current_user=STUDENT))
+    assert run(store.list("test-1"))[0]["status"] == "suspended"
+    assert run(store.is_active("test-1", "student-1"))
+
+
+def test_stale_sessions_expire(store, run):
+    store.ttl_seconds = -1
+    run(store.start("test-1", "student-1", "Student 1", "REG0001"))
+    assert run(store.list("test-1")) == []
+    with pytest.raises(server.HTTPException) as error:
+        run(server.test_heartbeat("test-1", server.Heartbeat(current_question=1), current_user=STUDENT))
+    assert error.value.status_code == 404
+
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def test_live_stream_sends_snapshot_then_coalesced_deltas(run, monkeypatch):
+    import asyncio
+    import json
+
+    store = server.InMemoryLiveSessionStore(ttl_seconds=60)
+    monkeypatch.setattr(server, "live_session_store", store)
+    monkeypatch.setattr(server, "live_monitor_hub", server.LiveMonitorHub(tick_seconds=0.01, queue_size=10))
+    token = run(server.issue_live_stream_token("test-1", current_user=STAFF))["token"]
+
+    async def scenario():
+        await store.start("test-1", "s1", "Student 1", "REG0001")
+        response = await server.stream_live_test_status("test-1", FakeRequest(), token=token)
+        events = response.body_iterator
+
+        def parse(chunk):
+            lines = chunk.strip().split("\n")
+            return lines[0].split(": ")[1], json.loads(lines[1][len("data: "):])
+
+        event, snapshot = parse(await events.__anext__())
+        assert event == "snapshot"
+        assert [s["student_id"] for s in snapshot["students"]] == ["s1"]
+
+        await store.start("test-1", "s2", "Student 2", "REG0002")
+        await store.heartbeat("test-1", "s1", 3, "active")
+        await store.heartbeat("test-1", "s1", 4, "active")
+        event, delta = parse(await events.__anext__())
+        assert event == "delta"
+        assert [s["student_id"] for s in delta["joined"]] == ["s2"]
+        assert delta["progress"] == [{"student_id": "s1", "current_question": 4, "status": "active"}]
+
+        await store.end("test-1", "s1")
+        assert parse(await events.__anext__()) == ("delta", {"submitted": ["s1"]})
+        await events.aclose()
+        await asyncio.sleep(0.05)
+        assert not server.live_monitor_hub._monitors
+
+    run(scenario())
+
+
+def test_live_stream_only_accepts_its_own_short_lived_token(mock_db, run):
+    login_token = server.create_access_token({"user_id": "staff-1", "user_type": "staff"})
+    stream_token = server.create_stream_token("staff-1", "test-1")
+
+    for token, test_id in [(login_token, "test-1"), (stream_token, "test-2")]:
+        with pytest.raises(server.HTTPException) as error:
+            run(server.stream_live_test_status(test_id, FakeRequest(), token=token))
+        assert error.value.status_code == 401
+
+    # Nor does the stream token work as a bearer token anywhere else
+    with pytest.raises(server.HTTPException) as error:
+        server.decode_token(stream_token)
+    assert error.value.status_code == 401
+    with pytest.raises(server.HTTPException) as error:
+        run(server.issue_live_stream_token("test-1", current_user=STUDENT))
+    assert error.value.status_code == 403
+
+
+def test_slow_subscriber_is_resynchronised_with_a_snapshot():
+    monitor = server.LiveMonitor("test-1", tick_seconds=1, queue_size=2)
+    subscriber = server.LiveMonitorSubscriber(queue_size=2)
+    subscriber.needs_snapshot = False
+    monitor.subscribers.add(subscriber)
+    for i in range(3):
+        monitor.publish({"left": [f"s{i}"]})
+    assert subscriber.needs_snapshot
+    assert subscriber.queue.empty()
@@ -0,0 +1,35 @@
+import importlib.util
+import os
+import random
+
+import pytest
+
+spec = importlib.util.spec_from_file_location(
+    "loadtest", os.path.join(os.path.dirname(__file__), "..", "benchmarks", "loadtest.py")
+)
+loadtest = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(loadtest)
+
+
+def test_arrival_curves():
+    rng = random.Random(0)
+    assert loadtest.arrival_offsets("burst", 3, 10, rng) == [0.0, 0.0, 0.0]
+    assert loadtest.arrival_offsets("ramp", 4, 8, rng) == [0.0, 2.0, 4.0, 6.0]
+    poisson = loadtest.arrival_offsets("poisson", 200, 10, rng)
+    assert poisson[0] == 0.0 and poisson == sorted(poisson)
+    assert 5 < poisson[-1] < 15
+
+
+@pytest.mark.usefixtures("mock_db")
+def test_small_cohort_completes_every_exam_lifecycle():
+    options = loadtest.parse_args(["--students", "3", "--pool-size", "10", "--question-count", "5"])
+    report = loadtest.run_loadtest(options)
+
+    assert report["lifecycles"] == {**report["lifecycles"], "started": 3, "completed": 3, "failed": 0}
+    assert set(report["endpoints"]) == {
+        "POST /api/login", "GET /api/student/available-tests",
+        "GET /api/test/{test_id}/questions", "POST /api/test/submit",
+    }
+    for stats in report["endpoints"].values():
+        assert stats["requests"] == 3 and stats["error_rate"] == 0
+        assert stats["latency_ms"]["p50"] <= stats["latency_ms"]["p99"] <= stats["latency_ms"]["max"]
@@ -0,0 +1,77 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    server.metrics.clear()
+    yield
+    server.metrics.clear()
+
+
+def test_requests_are_recorded_per_route_template(mock_db):
+    client = TestClient(server.app)
+    client.get("/api/departments")
+    client.get("/api/test/abc/draft")
+    client.get("/api/test/xyz/draft")
+    client.get("/api/no-such-route")
+
+    assert server.http_requests_total.value("GET", "/api/departments", "200") == 1
+    assert server.http_requests_total.value("GET", "/api/test/{test_id}/draft", "403") == 2
+    assert server.http_requests_total.value("GET", "<unmatched>", "404") == 1
+    assert server.http_request_duration.value("GET", "/api/test/{test_id}/draft")[0] == 2
+    assert server.http_requests_in_progress.value("GET") == 0
+
+    body = client.get("/api/metrics").text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/departments",le="+Inf"} 1' in body
+    assert 'http_requests_total{method="GET",route="/api/test/{test_id}/draft",status="403"} 2' in body
+
+
+def test_metrics_token_is_required_when_configured(mock_db, monkeypatch):
+    monkeypatch.setattr(server, "METRICS_TOKEN", "scrape-secret")
+    client = TestClient(server.app)
+    assert client.get("/api/metrics").status_code == 401
+    assert client.get("/api/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+
+
+def command_event(name, command=None, reply=None, request_id=1, micros=1500):
+    return SimpleNamespace(
+        command_name=name, command=command or {}, reply=reply or {}, database_name="kongu_mcq_db",
+        connection_id=("localhost", 27017), request_id=request_id, duration_micros=micros,
+    )
+
+
+def test_mongo_commands_are_timed_per_collection():
+    listener = server.MongoCommandMetrics()
+    listener.started(command_event("find", {"find": "questions"}, request_id=1))
+    listener.succeeded(command_event("find", reply={"cursor": {"firstBatch": [{}, {}, {}]}}, request_id=1))
+    listener.started(command_event("getMore", {"getMore": 7, "collection": "questions"}, request_id=2))
+    listener.succeeded(command_event("getMore", reply={"cursor": {"nextBatch": [{}]}}, request_id=2))
+    listener.started(command_event("insert", {"insert": "test_attempts"}, request_id=3))
+    listener.failed(command_event("insert", request_id=3))
+
+    assert server.mongo_command_duration.value("questions", "find") == (1, 0.0015)
+    assert server.mongo_documents.value("questions", "find") == 3
+    assert server.mongo_documents.value("questions", "getMore") == 1
+    assert server.mongo_command_failures.value("test_attempts", "insert") == 1
+
+
+def test_event_loop_lag_is_observed_when_the_loop_blocks():
+    async def scenario():
+        monitor = server.EventLoopLagMonitor(0.01)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+    count, total = server.event_loop_lag.value()
+    assert count >= 2 and total >= 0.05
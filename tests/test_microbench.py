@@ -0,0 +1,32 @@
+import importlib.util
+import os
+import random
+
+import pytest
+
+spec = importlib.util.spec_from_file_location(
+    "microbench", os.path.join(os.path.dirname(__file__), "..", "benchmarks", "microbench.py")
+)
+microbench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(microbench)
+
+SIZES = {"pool_size": 12, "attempts": 8, "question_count": 5}
+
+
+@pytest.mark.parametrize("name", sorted(microbench.BENCHMARKS))
+def test_benchmarks_run_without_a_database(name, monkeypatch):
+    # Any database access would fail loudly instead of being timed
+    monkeypatch.setattr(microbench.server, "db", None)
+    func = microbench.BENCHMARKS[name](SIZES, random.Random(0))
+    func()
+    func()
+
+
+def test_compare_flags_only_regressions_past_threshold():
+    comparison = microbench.compare(
+        {"fast": 1.0, "slow": 1.3, "new": 2.0},
+        {"fast": 1.2, "slow": 1.0},
+        threshold=0.25,
+    )
+    assert {name: row["regressed"] for name, row in comparison.items()} == {"fast": False, "slow": True, "new": False}
+    assert comparison["new"]["ratio"] is None
@@ -0,0 +1,50 @@
+import pytest
+from fastapi import HTTPException
+
+import server
+
+STAFF = {"user_id": "staff-1", "user_type": "staff"}
+
+
+async def seed(db, count):
+    for i in range(count):
+        await db.questions.insert_one({
+            "id": f"q{i:03d}", "question_text": f"Question {i}", "options": ["a", "b"],
+            "correct_answer": 0, "explanation": "", "subject_id": "subject-1",
+            "units": ["Unit 1"], "created_by": "staff-1",
+        })
+
+
+def test_questions_are_paged_with_continuation_tokens(mock_db, run):
+    run(seed(mock_db, 12))
+    seen = []
+    cursor = None
+    while True:
+        page = run(server.get_staff_questions(limit=5, cursor=cursor, fields="id,question_text", current_user=STAFF))
+        assert len(page["questions"]) <= 5
+        assert all(set(q) == {"id", "question_text"} for q in page["questions"])
+        seen.extend(q["id"] for q in page["questions"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [f"q{i:03d}" for i in range(12)]
+
+
+def test_default_page_size_applies_and_limit_is_capped(mock_db, run, monkeypatch):
+    run(seed(mock_db, 12))
+    monkeypatch.setattr(server, "PAGE_SIZE_DEFAULT", 5)
+    monkeypatch.setattr(server, "PAGE_SIZE_MAX", 8)
+
+    unpaged = run(server.get_staff_questions(current_user=STAFF))
+    assert len(unpaged["questions"]) == 5 and unpaged["next_cursor"]
+
+    page = run(server.get_staff_questions(limit=100, current_user=STAFF))
+    assert len(page["questions"]) == 8 and page["next_cursor"]
+    rest = run(server.get_staff_questions(limit=100, cursor=page["next_cursor"], current_user=STAFF))
+    assert len(rest["questions"]) == 4 and rest["next_cursor"] is None
+
+
+def test_invalid_cursor_is_rejected(mock_db, run):
+    with pytest.raises(HTTPException) as error:
+        run(server.get_staff_questions(cursor="not-a-cursor", current_user=STAFF))
+    assert error.value.status_code == 400
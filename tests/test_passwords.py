@@ -0,0 +1,43 @@
+import pytest
+
+import server
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    password_hasher = server.PasswordHasher(rounds=1000, workers=1, concurrency=2)
+    monkeypatch.setattr(server, "password_hasher", password_hasher)
+    yield password_hasher
+    password_hasher.shutdown()
+
+
+def login(run, password):
+    request = server.LoginRequest(identifier="REG0001", password=password, user_type="student")
+    return run(server.login(request))
+
+
+def test_legacy_hash_is_upgraded_on_successful_login(mock_db, run, hasher):
+    run(mock_db.students.insert_one({
+        "id": "s1", "name": "Student 1", "register_number": "REG0001", "department": "Civil Engineering",
+        "email": "s1@example.com", "password": server.legacy_hash_password("secret"),
+    }))
+
+    with pytest.raises(server.HTTPException):
+        login(run, "wrong")
+    assert server.is_legacy_hash(run(mock_db.students.find_one({"id": "s1"}))["password"])
+
+    assert login(run, "secret")["user"]["id"] == "s1"
+    stored = run(mock_db.students.find_one({"id": "s1"}))["password"]
+    assert stored.startswith("$pbkdf2-sha256$1000$")
+    assert login(run, "secret")["user"]["id"] == "s1"
+
+
+def test_concurrent_hashing_queues_beyond_the_limit(run, hasher):
+    import asyncio
+
+    async def hash_many():
+        return await asyncio.gather(*[hasher.hash(f"password-{i}") for i in range(6)])
+
+    hashes = run(hash_many())
+    assert len(set(hashes)) == 6
+    assert all(server.verify_password_sync(f"password-{i}", h, 1000) == (True, None) for i, h in enumerate(hashes))
@@ -0,0 +1,32 @@
+import server
+
+
+def test_profile_comes_from_token_claims_without_a_read(mock_db, run):
+    token = server.create_access_token({
+        "user_id": "s1", "user_type": "student",
+        "profile": {"id": "s1", "name": "Student 1", "department": "Civil Engineering", "year": 2},
+    })
+    principal = run(server.current_principal(server.decode_token(token)))
+    assert principal["profile"]["department"] == "Civil Engineering"
+    assert mock_db.total_commands == 0
+
+
+def test_profile_without_claims_is_read_once_then_cached(mock_db, run):
+    run(mock_db.staff.insert_one({
+        "id": "t1", "name": "Staff 1", "department": "Basic Science", "academic_year": "2025",
+        "email": "t1@example.com", "password": "x",
+    }))
+    mock_db.reset()
+    for _ in range(3):
+        principal = run(server.current_principal({"user_id": "t1", "user_type": "staff"}))
+    assert principal["profile"] == {
+        "id": "t1", "name": "Staff 1", "department": "Basic Science", "academic_year": "2025", "email": "t1@example.com",
+    }
+    assert mock_db.commands == {"staff": 1}
+
+
+def test_repeated_tokens_skip_signature_verification(monkeypatch):
+    token = server.create_access_token({"user_id": "s1", "user_type": "student"})
+    payload = server.decode_token(token)
+    monkeypatch.setattr(server.jwt, "decode", lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError))
+    assert server.decode_token(token) is payload
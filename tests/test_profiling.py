@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import server
+
+
+def bearer(user_type, user_id):
+    return {"Authorization": f"Bearer {server.create_access_token({'user_id': user_id, 'user_type': user_type})}"}
+
+
+def stored_profiles(run, mock_db):
+    return run(mock_db.request_profiles.find({}, {"_id": 0}).to_list(None))
+
+
+def test_staff_header_profiles_the_request(mock_db, run):
+    client = TestClient(server.app)
+    staff = bearer("staff", "staff-1")
+
+    response = client.get("/api/departments", headers={**staff, "X-Profile": "1"})
+    profile_id = response.headers["x-profile-id"]
+
+    profile = client.get(f"/api/staff/profiles/{profile_id}", headers=staff).json()
+    assert profile["route"] == "/api/departments"
+    assert profile["status"] == 200
+    assert (profile["trigger"], profile["requested_by"]) == ("header", "staff-1")
+    assert "get_departments" in profile["stats"]
+
+    listed = client.get("/api/staff/profiles", headers=staff).json()["profiles"]
+    assert [p["id"] for p in listed] == [profile_id]
+    assert "stats" not in listed[0]
+
+
+def test_unprivileged_and_unsampled_requests_are_not_profiled(mock_db, run):
+    client = TestClient(server.app)
+    assert "x-profile-id" not in client.get("/api/departments").headers
+    student = client.get("/api/departments", headers={**bearer("student", "student-1"), "X-Profile": "1"})
+    assert "x-profile-id" not in student.headers
+    assert client.get("/api/staff/profiles", headers=bearer("student", "student-1")).status_code == 403
+    assert stored_profiles(run, mock_db) == []
+
+
+def test_sampling_profiles_requests_but_not_excluded_paths(mock_db, run, monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_SAMPLE_RATE", 1.0)
+    client = TestClient(server.app)
+    assert "x-profile-id" in client.get("/api/units").headers
+    assert "x-profile-id" not in client.get("/api/metrics").headers
+    assert [(p["route"], p["trigger"]) for p in stored_profiles(run, mock_db)] == [("/api/units", "sample")]
+
+
+def test_mongo_commands_are_traced_only_inside_a_profiled_context():
+    listener = server.MongoCommandMetrics()
+    event = SimpleNamespace(
+        command_name="find", command={"find": "test_attempts"}, reply={"cursor": {"firstBatch": [{}, {}]}},
+        database_name="kongu_mcq_db", connection_id=("localhost", 27017), request_id=9, duration_micros=2500,
+    )
+    listener.started(event)
+    listener.succeeded(event)
+
+    trace = []
+    token = server.mongo_command_trace.set(trace)
+    try:
+        listener.started(event)
+        listener.succeeded(event)
+    finally:
+        server.mongo_command_trace.reset(token)
+    assert trace == [{"collection": "test_attempts", "command": "find", "duration_ms": 2.5, "documents": 2, "ok": True}]
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import server
+
+STAFF = {"user_id": "staff-1", "user_type": "staff"}
+STUDENT = {"user_id": "student-1", "user_type": "student"}
+
+
+async def seed(db, question_count):
+    now = datetime.utcnow()
+    await db.students.insert_one({
+        "id": "student-1",
+        "name": "Student 1",
+        "register_number": "REG0001",
+        "department": "Computer Engineering",
+        "year": 2,
+    })
+    await db.subjects.insert_one({"id": "subject-1", "name": "Subject", "course_code": "C1"})
+    await db.tests.insert_one({
+        "id": "test-1",
+        "subject_id": "subject-1",
+        "start_date": now - timedelta(hours=1),
+        "end_date": now + timedelta(hours=1),
+        "duration_minutes": 30,
+        "target_year": 2,
+        "department": "Computer Engineering",
+        "is_active": True,
+    })
+    for i in range(question_count):
+        await db.questions.insert_one({
+            "id": f"question-{i}",
+            "question_text": f"Question {i}",
+            "options": ["a", "b", "c", "d"],
+            "correct_answer": i % 4,
+            "explanation": "because",
+            "subject_id": "subject-1",
+            "units": ["Unit 1"],
+        })
+    db.reset()
+
+
+def test_question_pool_is_read_once_and_sanitized(mock_db, run, principal):
+    run(seed(mock_db, question_count=30))
+    first = run(server.get_test_questions("test-1", current_user=principal(STUDENT)))
+    second = run(server.get_test_questions("test-1", current_user=principal(STUDENT)))
+    # One id-only pool read plus one fetch of the selected paper
+    assert mock_db.commands["questions"] == 2
+    assert len(first["questions"]) == 25
+    assert first["questions"] == second["questions"]
+    assert all("correct_answer" not in q and "explanation" not in q for q in first["questions"])
+
+
+def test_paper_selection_is_reproducible_and_per_student():
+    ids = tuple(f"question-{i}" for i in range(200))
+    paper = server.select_paper_ids("test-1", "student-1", ids, 25)
+    assert paper == server.select_paper_ids("test-1", "student-1", ids, 25)
+    assert len(set(paper)) == 25
+    assert paper != server.select_paper_ids("test-1", "student-2", ids, 25)
+    assert len(server.select_paper_ids("test-1", "student-1", ids[:10], 25)) == 10
+
+
+def test_create_question_invalidates_subject_pool(mock_db, run, principal):
+    run(seed(mock_db, question_count=2))
+    assert len(run(server.get_test_questions("test-1", current_user=principal(STUDENT)))["questions"]) == 2
+    question = server.QuestionCreate(
+        question_text="New", options=["a", "b"], correct_answer=0,
+        explanation="", subject_id="subject-1", units=["Unit 2"],
+    )
+    run(server.create_question(question, current_user=STAFF))
+    assert len(run(server.get_test_questions("test-1", current_user=principal(STUDENT)))["questions"]) == 3
+
+
+def test_cache_evicts_least_recently_used():
+    cache = server.PerTestCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", "s", ("qa",))
+    cache.set("b", "s", ("qb",))
+    cache.get("a")
+    cache.set("c", "s", ("qc",))
+    assert cache.get("b") is None
+    assert cache.get("a") == ("qa",)
+    cache.set("d", "s", ("qd",), ttl_seconds=0)
+    assert cache.get("d") is None
+
+
+def test_load_locks_do_not_outlive_concurrent_loads(mock_db, run):
+    run(seed(mock_db, question_count=30))
+    tests = [{**run(mock_db.tests.find_one({"id": "test-1"}, {"_id": 0})), "id": f"test-{i}"} for i in range(20)]
+
+    async def cohort_start():
+        return await asyncio.gather(*(server.get_question_pool(test) for test in tests * 5))
+
+    mock_db.reset()
+    pools = run(cohort_start())
+    # Every request for a test shares the pool loaded once under its lock
+    assert len({id(pool) for pool in pools}) == 20
+    assert mock_db.commands.get("questions") == 20
+    assert server.question_pool_cache._locks == {}
@@ -0,0 +1,83 @@
+import json
+from datetime import datetime
+
+import numpy as np
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import server
+
+
+def make_client():
+    app = FastAPI(default_response_class=server.FastJSONResponse)
+    app.router.route_class = server.FastJSONRoute
+    app.add_middleware(server.CompressionMiddleware, minimum_size=512)
+
+    @app.get("/rows")
+    async def rows(count: int = 200):
+        return {"rows": [{"id": i, "name": f"student-{i}", "score": np.float64(i / 2)} for i in range(count)]}
+
+    @app.get("/cached")
+    async def cached(if_none_match: str = server.Header(None)):
+        async def build():
+            return {"rows": [f"subject-{i}" for i in range(200)]}
+        return await server.cached_json_response(("cached", 1), if_none_match, "no-cache", build)
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(iter([b"a" * 2048, b"b" * 2048]), media_type="text/event-stream")
+
+    return TestClient(app)
+
+
+def test_render_json_handles_mongo_and_numpy_values():
+    when = datetime(2026, 1, 2, 3, 4, 5)
+    oid = ObjectId()
+    payload = {"_id": oid, "at": when, "scores": np.array([1, 2]), 3: "int key"}
+    assert json.loads(server.render_json(payload)) == {
+        "_id": str(oid), "at": when.isoformat(), "scores": [1, 2], "3": "int key"
+    }
+    # Unsupported types fall back to jsonable_encoder
+    model = server.Heartbeat(current_question=2)
+    assert json.loads(server.render_json({"heartbeat": model}))["heartbeat"]["current_question"] == 2
+
+
+def test_large_responses_are_compressed_when_accepted():
+    client = make_client()
+    plain = client.get("/rows", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+    compressed = client.get("/rows", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert compressed.json() == plain.json()
+    assert int(compressed.headers["content-length"]) < len(plain.content)
+
+    if server.brotli is not None:
+        assert client.get("/rows", headers={"Accept-Encoding": "gzip, br"}).headers["content-encoding"] == "br"
+
+
+def test_small_and_streaming_responses_pass_through():
+    client = make_client()
+    small = client.get("/rows", params={"count": 1}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    stream = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in stream.headers
+    assert stream.content == b"a" * 2048 + b"b" * 2048
+
+
+def test_compressed_responses_get_their_own_strong_etag():
+    client = make_client()
+    plain = client.get("/cached", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/cached", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+    # Either validator revalidates, and the 304 echoes the one the client holds
+    for etag in (plain.headers["etag"], compressed.headers["etag"]):
+        repeat = client.get("/cached", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert repeat.status_code == 304
+        assert repeat.headers["etag"] == etag
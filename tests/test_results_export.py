@@ -0,0 +1,51 @@
+import csv
+from io import BytesIO, StringIO
+
+from openpyxl import load_workbook
+
+import server
+
+STAFF = {"user_id": "staff-1", "user_type": "staff"}
+
+
+async def seed(db, count):
+    for i in range(count):
+        await db.students.insert_one({
+            "id": f"s{i}", "name": f"Student {i}", "register_number": f"REG{i:04d}",
+            "email": f"s{i}@example.com", "department": "Computer Engineering", "year": 2,
+        })
+        await db.test_attempts.insert_one({
+            "id": f"a{i}", "test_id": "test-1", "student_id": f"s{i}", "answers": {"q1": 0},
+            "score": i % 5, "total_questions": 5, "is_malpractice": False, "tab_switches": 0,
+            "unit_performance": {"Unit 2": {"correct": i % 5, "total": 5}}, "submitted_at": "2025-01-01",
+        })
+
+
+async def collect(response):
+    chunks = []
+    async for chunk in response.body_iterator:
+        chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode())
+    return chunks
+
+
+def test_csv_export_streams_joined_rows_in_batches(mock_db, run, monkeypatch):
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 4)
+    run(seed(mock_db, 10))
+    response = run(server.export_test_results("test-1", format="csv", current_user=STAFF))
+    chunks = run(collect(response))
+
+    assert len(chunks) == 4  # header, then batches of 4, 4 and 2 rows
+    rows = list(csv.reader(StringIO(b"".join(chunks).decode())))
+    assert rows[0] == server.EXPORT_COLUMNS
+    assert len(rows) == 11
+    assert rows[4][1] == "REG0003"
+    assert rows[4][server.EXPORT_COLUMNS.index("Unit 2 (correct/total)")] == "3/5"
+
+
+def test_xlsx_export(mock_db, run):
+    run(seed(mock_db, 3))
+    response = run(server.export_test_results("test-1", format="xlsx", current_user=STAFF))
+    sheet = load_workbook(BytesIO(b"".join(run(collect(response))))).active
+    rows = list(sheet.iter_rows(values_only=True))
+    assert list(rows[0]) == server.EXPORT_COLUMNS
+    assert rows[3][0] == "Student 2"